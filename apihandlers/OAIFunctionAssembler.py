@@ -1,5 +1,3 @@
-from openai import OpenAI
-
 def get_fixer_tools():
     """
     Returns a list of tool definitions for use with OpenAI API.
@@ -11,11 +11,30 @@ import time
 OAIClient = None
 ConfigHandler = None
 
+def _make_http_client():
+    """
+    Build the HTTP client every OpenAI request goes through.
+    
+    Connections are kept alive long enough to span the gap between fixer
+    turns, so a whole repair rides one TLS session.
+    
+    Returns:
+        httpx.Client: The pooled client, or None to use the OpenAI default
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=120),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+
 def get_oai_client():
     """Get OpenAI client, initializing if needed"""
     global OAIClient
     if OAIClient is None:
-        OAIClient = OpenAI(api_key=OAIKeys.get_api_key())
+        OAIClient = OpenAI(api_key=OAIKeys.get_api_key(), http_client=_make_http_client())
     return OAIClient
 
 def get_config_handler():
@@ -248,8 +267,9 @@ def find_process(pid=None, process_name=None):
         elif process_name or pid:
             # Search by name (or non-numeric identifier)
             name_to_search = process_name or pid
+            needle = name_to_search.lower()
             for proc in psutil.process_iter(['pid', 'name']):
-                if name_to_search.lower() in proc.info['name'].lower():
+                if needle in proc.info['name'].lower():
                     return proc
             print(f"No process matching '{name_to_search}' found")
             return None
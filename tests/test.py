@@ -10,8 +10,22 @@ import signal
 import json
 from unittest.mock import patch, MagicMock, mock_open
 
-# Add the parent directory to the path so we can import modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Make the repository root importable once, however the suite is launched
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import internal.confighandler as confighandler
+import main
+from main import find_process, watch_new_process, stop_watcher
+import watchers.base_watcher as base_watcher
+import psutil
+import watchers.fixers.base_fixer as base_fixer
+from watchers.fixers.base_fixer import BaseFixer
+import watchers.fixers.tools_handler as tools_handler
+from watchers.fixers.tools_handler import ToolsHandler
+import watchers.subwatchers.relavance_finder as relavance_finder
+from watchers.subwatchers.relavance_finder import find_relevant_code
 
 # Create a mock ConfigHandler class
 class MockConfigHandler:
@@ -30,41 +44,60 @@ class MockConfigHandler:
             return "You are a helpful assistant that fixes code errors."
         return default
 
-# Patch the ConfigHandler before importing any modules that use it
-import internal.confighandler as confighandler
+# ConfigHandler is only looked up when a handler is created, so a single patch
+# for the whole run covers every module without ordering the imports around it
 original_ConfigHandler = confighandler.ConfigHandler
-confighandler.ConfigHandler = MockConfigHandler
-
-# Now import other modules
-import main
-from main import find_process
-import watchers.base_watcher as base_watcher
-import psutil
-from watchers.fixers.base_fixer import BaseFixer
-from watchers.fixers.tools_handler import ToolsHandler
+patch.object(confighandler, "ConfigHandler", MockConfigHandler).start()
 
-def is_wsl():
+def _detect_wsl():
     """Check if running under Windows Subsystem for Linux"""
+    if not os.path.exists('/proc/version'):
+        return False
     try:
         with open('/proc/version', 'r') as f:
             return 'microsoft' in f.read().lower()
-    except:
+    except OSError:
         return False
 
+# Resolved once at import instead of in every setUp/test
+_IS_WSL = _detect_wsl()
+_PY = sys.executable
+
+def make_canned_pipe(data):
+    """Open a pipe that yields data and then EOF"""
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, data.encode('utf-8'))
+    os.close(write_fd)
+    return os.fdopen(read_fd, 'rb')
+
+def make_fake_process(stdout="", stderr="", pid=4242, running=False):
+    """Build a Popen stand-in whose streams replay canned output"""
+    process = MagicMock()
+    process.pid = pid
+    process.stdout = make_canned_pipe(stdout)
+    process.stderr = make_canned_pipe(stderr)
+    process.wait.return_value = 0
+    process.poll.return_value = None if running else 0
+    process.returncode = 0
+    return process
+
+# Real subprocess tests are slow, so they only run when explicitly requested
+RUN_INTEGRATION_TESTS = bool(os.environ.get("WATCHMIN_INTEGRATION_TESTS"))
+
 # Configure the mock ConfigHandler for the modules that need it
 
 class TestProcessFunctions(unittest.TestCase):
     
     def setUp(self):
         """Set up for the tests"""
-        if sys.platform == 'win32' and not is_wsl():
+        if sys.platform == 'win32' and not _IS_WSL:
             print("WARNING: This application is meant to be run on Linux or WSL.")
             print("For best results, please run these tests using Windows Subsystem for Linux (WSL).")
     
     def test_find_process_by_name(self):
         """Test finding a process by name"""
         # Find a common process that should be running
-        if sys.platform == 'win32' and not is_wsl():
+        if sys.platform == 'win32' and not _IS_WSL:
             process_name = 'explorer'
         else:
             # Linux or WSL
@@ -91,11 +124,6 @@ class TestProcessFunctions(unittest.TestCase):
 class TestBaseWatcher(unittest.TestCase):
     """Basic tests for the BaseWatcher class"""
     
-    def setUp(self):
-        """Set up test environment"""
-        # Store the python executable path
-        self.python_exe = sys.executable
-    
     def test_watcher_init(self):
         """Test initializing a BaseWatcher"""
         # Test with buffer_size explicitly provided
@@ -107,8 +135,54 @@ class TestBaseWatcher(unittest.TestCase):
         
     def test_start_process(self):
         """Test starting a process with BaseWatcher"""
+        fake_process = make_fake_process(stdout="Test output\n")
+        with patch('watchers.base_watcher.subprocess.Popen', return_value=fake_process):
+            watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+            
+            # Start the process
+            pid = watcher.start()
+            
+            # Check that we got the PID of the process
+            self.assertEqual(pid, fake_process.pid)
+            
+            # Wait for the streams to be drained
+            watcher.wait()
+        
+        # Check logs
+        logs = watcher.get_logs()
+        self.assertTrue("Test output" in logs)
+
+    def test_start_process_without_shell(self):
+        """Test that only commands using shell syntax are run through the shell"""
+        with patch('watchers.base_watcher.subprocess.Popen', side_effect=lambda *a, **k: make_fake_process()) as mock_popen:
+            watcher = base_watcher.BaseWatcher(process_target='python app.py "two words"', buffer_size=50)
+            watcher.start()
+            watcher.wait()
+            self.assertEqual(mock_popen.call_args[0][0], ["python", "app.py", "two words"])
+            self.assertNotIn("shell", mock_popen.call_args[1])
+
+            watcher = base_watcher.BaseWatcher(process_target="python app.py 2>&1 | tee out.log", buffer_size=50)
+            watcher.start()
+            watcher.wait()
+            self.assertEqual(mock_popen.call_args[0][0], "python app.py 2>&1 | tee out.log")
+            self.assertTrue(mock_popen.call_args[1]["shell"])
+
+    def test_legacy_get_logs(self):
+        """Test that the legacy get_logs finds the watcher for a process"""
+        fake_process = make_fake_process(stdout="Legacy output\n")
+        with patch('watchers.base_watcher.subprocess.Popen', return_value=fake_process):
+            watcher = base_watcher.BaseWatcher(process_target="legacy command", buffer_size=50)
+            watcher.start()
+            watcher.wait()
+
+        self.assertIn("Legacy output", base_watcher.get_logs("legacy command"))
+        self.assertIn("No logs available", base_watcher.get_logs("unknown command"))
+
+    @unittest.skipUnless(RUN_INTEGRATION_TESTS, "set WATCHMIN_INTEGRATION_TESTS=1 to run")
+    def test_start_process_integration(self):
+        """Test starting a real process with BaseWatcher"""
         # Use a simple echo command
-        cmd = f"{self.python_exe} -c \"print('Test output'); import time; time.sleep(0.5)\""
+        cmd = f"{_PY} -c \"print('Test output'); import time; time.sleep(0.5)\""
         watcher = base_watcher.BaseWatcher(process_target=cmd, buffer_size=50)
         
         # Start the process
@@ -129,15 +203,15 @@ class TestBaseWatcher(unittest.TestCase):
         """Test error detection in process output"""
         # Create a BaseWatcher with a patched start_repair method
         mock_start_repair = MagicMock()
-        with patch.object(base_watcher.BaseWatcher, 'start_repair', mock_start_repair):
-            # Start a process that will output an error
-            cmd = f"{self.python_exe} -c \"import sys; print('Normal output'); sys.stderr.write('Error: test error\\n'); sys.stdout.flush(); sys.stderr.flush()\""
-            watcher = base_watcher.BaseWatcher(process_target=cmd, buffer_size=50)
+        fake_process = make_fake_process(stdout="Normal output\n", stderr="Error: test error\n")
+        with patch.object(base_watcher.BaseWatcher, 'start_repair', mock_start_repair), \
+                patch('watchers.base_watcher.subprocess.Popen', return_value=fake_process):
+            watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
             
             # Start the process
             watcher.start()
             
-            # Wait for process to complete
+            # Wait for the streams to be drained
             watcher.wait()
             
             # Check that start_repair was called
@@ -149,14 +223,266 @@ class TestBaseWatcher(unittest.TestCase):
             # Verify error message is in the first argument
             self.assertTrue("Error: test error" in call_args[0])
 
+    def test_repair_cooldown(self):
+        """Test that a burst of error lines starts only one repair"""
+        fake_process = make_fake_process(stderr="Traceback (most recent call last):\nValueError: bad\nError: again\n")
+        with patch.object(base_watcher.BaseWatcher, 'start_repair') as mock_start_repair, \
+                patch('watchers.base_watcher.subprocess.Popen', return_value=fake_process):
+            watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+            watcher.start()
+            watcher.wait()
+
+        mock_start_repair.assert_called_once()
+        self.assertIn("Traceback", mock_start_repair.call_args[0][0])
+        # Every line is still kept for the repair's logs
+        self.assertIn("Error: again", watcher.get_logs())
+
+    def test_carriage_returns_end_lines(self):
+        """Test that \\r ends a line, as it does for a text-mode pipe, and long partials are bounded"""
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+        with patch.object(base_watcher.BaseWatcher, 'start_repair') as mock_start_repair:
+            watcher.feed_output(b" 10%|#\r 50%|#####\r", "stderr")
+            watcher.feed_output(b"\nError: after progress\r\n", "stderr")
+            watcher.feed_output(b"x" * (base_watcher.MAX_PARTIAL_LINE + 1), "stdout")
+
+        self.assertEqual(watcher.get_logs(), "[stderr] 10%|#\n[stderr] 50%|#####\n[stderr] Error: after progress\n[stdout] " + "x" * (base_watcher.MAX_PARTIAL_LINE + 1))
+        self.assertEqual(mock_start_repair.call_args[0][0], "Error: after progress")
+        self.assertEqual(len(watcher._partial_lines["stdout"]), 0)
+
+    def test_repair_logs_include_later_chunks(self):
+        """Test that error lines written after the first one reach the repair's logs"""
+        repaired = []
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+        with patch.object(base_watcher.BaseWatcher, '_do_repair', lambda w, error, logs: repaired.append((error, logs))):
+            watcher.feed_output(b"Traceback (most recent call last):\n", "stderr")
+            watcher.feed_output(b"ValueError: bad\n", "stderr")
+            watcher.wait()
+
+        self.assertEqual(len(repaired), 1)
+        error, logs = repaired[0]
+        self.assertEqual(error, "Traceback (most recent call last):")
+        self.assertIn("ValueError: bad", logs)
+
+    def test_configured_error_keywords(self):
+        """Test that error detection uses the configured keywords"""
+        config = MagicMock()
+        config.get_value.side_effect = lambda key, default=None: ["Panic"] if key == "error_keywords" else default
+        with patch.object(base_watcher.BaseWatcher, 'start_repair') as mock_start_repair:
+            watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50, config_handler=config)
+            watcher.feed_output(b"Error: not a keyword here\nPANIC: kernel\n", "stderr")
+
+        mock_start_repair.assert_called_once()
+        self.assertEqual(mock_start_repair.call_args[0][0], "PANIC: kernel")
+        # Watchers with the same keywords share one compiled pattern
+        other = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50, config_handler=config)
+        self.assertIs(other._error_pattern, watcher._error_pattern)
+
+    def test_repair_queue(self):
+        """Test that repairs run on the repair worker and overflow is dropped"""
+        started = threading.Event()
+        release = threading.Event()
+        repaired = []
+        def fake_repair(watcher, error, logs):
+            started.set()
+            release.wait(5)
+            repaired.append((error, threading.current_thread().name))
+
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+        with patch.object(base_watcher.BaseWatcher, '_do_repair', fake_repair):
+            watcher.start_repair("first", "logs")
+            self.assertTrue(started.wait(5))
+            # The first repair is running, so this fills the queue and overflows it by one
+            for i in range(base_watcher.REPAIR_QUEUE_SIZE + 1):
+                watcher.start_repair(f"queued {i}", "logs")
+            self.assertEqual(watcher._dropped_repairs, 1)
+
+            release.set()
+            watcher.wait()
+
+        self.assertEqual(len(repaired), base_watcher.REPAIR_QUEUE_SIZE + 1)
+        self.assertTrue(all(name == "watchmin-repair" for _, name in repaired))
+
+    def test_queued_repairs_share_relevance_lookup(self):
+        """Test that relevance lookups for queued repairs go out as one batch"""
+        config, client = MockConfigHandler(), MagicMock()
+        first = base_watcher.BaseWatcher(process_target="first", buffer_size=50, config_handler=config, oai_client=client)
+        second = base_watcher.BaseWatcher(process_target="second", buffer_size=50, config_handler=config, oai_client=client)
+        relevance = [{"file_path": "/app/a.py", "start_line": 1, "end_line": 1, "has_relevant_file": True},
+                     {"file_path": "/app/b.py", "start_line": 2, "end_line": 2, "has_relevant_file": True}]
+
+        with patch('watchers.base_watcher.find_relevant_code_batch', return_value=relevance) as mock_batch, \
+                patch('watchers.base_watcher.find_relevant_code') as mock_find:
+            base_watcher.BaseWatcher._prefetch_relevance([("a", "logs a", first), ("b", "logs b", second)])
+            self.assertEqual(first._find_relevant_code("logs a"), relevance[0])
+            self.assertEqual(second._find_relevant_code("logs b"), relevance[1])
+
+        mock_batch.assert_called_once()
+        self.assertEqual(mock_batch.call_args[0][0], ["logs a", "logs b"])
+        mock_find.assert_not_called()
+
+    def test_repeated_repairs_reuse_lookups(self):
+        """Test that repeat repairs reuse the fixer and the relevant-code lookup"""
+        source = tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False)
+        source.write("a = 1\nb = 2\nc = 3\n")
+        source.close()
+        self.addCleanup(os.unlink, source.name)
+        relevance = json.dumps({"file_path": source.name, "start_line": 1, "end_line": 2, "has_relevant_file": True})
+
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50,
+                                           config_handler=MockConfigHandler(), oai_client=MagicMock())
+        # Only the PID is needed; the output streams are never read
+        watcher.process = MagicMock(pid=4242)
+        def fake_fix(fixer, error, logs, relevant_code):
+            fixer.relevant_code = relevant_code
+            fixer.isfixed = True
+
+        with patch('watchers.base_watcher.find_relevant_code', return_value=relevance) as mock_find, \
+                patch.object(BaseFixer, 'fix', fake_fix):
+            watcher._do_repair("Error: boom", "logs")
+            fixer = watcher._fixer
+            watcher._do_repair("Error: boom", "logs")
+
+        mock_find.assert_called_once()
+        self.assertIs(watcher._fixer, fixer)
+        self.assertEqual(fixer.relevant_code, "b = 2\nc = 3\n")
+
+    def test_feed_output_chunk(self):
+        """Test that a chunk of output is buffered and scanned for errors line by line"""
+        self.assertEqual(base_watcher._error_lines(b"ok\nValueError: Exception\nfine\nerror"),
+                         [b"ValueError: Exception", b"error"])
+
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+        with patch.object(base_watcher.BaseWatcher, '_report_output_error') as mock_report:
+            watcher.feed_output(b"one\nTraceback here\ntwo\npart", "stderr")
+            mock_report.assert_called_once_with(b"Traceback here", "stderr")
+            self.assertEqual(len(watcher.output_buffer), 3)
+
+            # The partial line is completed by the next chunk
+            watcher.feed_output(b"ial error\n", "stderr")
+            mock_report.assert_called_with(b"partial error", "stderr")
+        self.assertTrue(watcher.get_logs().endswith("[stderr] partial error"))
+
+    def test_get_logs_keeps_latest_lines(self):
+        """Test that the output buffer keeps only the most recent lines"""
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=3)
+        for i in range(5):
+            watcher.handle_output_line(f"line {i}".encode(), "stdout")
+
+        self.assertEqual(len(watcher.output_buffer), 3)
+        self.assertEqual(watcher.get_logs(lines=2), "[stdout] line 3\n[stdout] line 4")
+        self.assertEqual(watcher.get_logs(lines=10), "[stdout] line 2\n[stdout] line 3\n[stdout] line 4")
+
+        # Unchanged logs are reused, and new output is picked up
+        logs = watcher.get_logs(lines=2)
+        self.assertIs(watcher.get_logs(lines=2), logs)
+        watcher.handle_output_line(b"line 5", "stdout")
+        self.assertEqual(watcher.get_logs(lines=2), "[stdout] line 4\n[stdout] line 5")
+
+    def test_ring_buffer_concurrent_writers(self):
+        """Test that concurrent writers never overwrite each other's lines"""
+        ring = base_watcher._RingBuffer(40000)
+        def write(tag):
+            for i in range(10000):
+                ring.append((tag, i))
+        threads = [threading.Thread(target=write, args=(tag,)) for tag in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(ring), 40000)
+        self.assertEqual(set(ring), {(tag, i) for tag in range(4) for i in range(10000)})
+
+    def test_find_process_log_files(self):
+        """Test finding log files the process has open"""
+        log_file = tempfile.NamedTemporaryFile(mode='w', suffix='.log')
+        self.addCleanup(log_file.close)
+        err_file = tempfile.NamedTemporaryFile(mode='w', suffix='.err')
+        self.addCleanup(err_file.close)
+        # Merely mentioning "log" in the name doesn't make a file a log
+        other_file = tempfile.NamedTemporaryFile(mode='w', prefix='catalog', suffix='.txt')
+        self.addCleanup(other_file.close)
+
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+        log_files = watcher.find_process_log_files(psutil.Process(os.getpid()))
+
+        self.assertIn(os.path.realpath(log_file.name), log_files)
+        self.assertIn(os.path.realpath(err_file.name), log_files)
+        self.assertNotIn(os.path.realpath(other_file.name), log_files)
+
+    def test_monitor_log_file(self):
+        """Test tailing lines appended to a log file"""
+        log_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.log')
+        log_file.write("Existing line\n")
+        log_file.close()
+        self.addCleanup(os.unlink, log_file.name)
+
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+        tail = watcher.monitor_log_file(log_file.name)
+        self.assertIsNotNone(tail)
+
+        with open(log_file.name, 'a') as f:
+            f.write("New line\nError: log failure\n")
+
+        # Errors are queued for the attached-process monitor to repair
+        try:
+            error = watcher._error_queue.get(timeout=5)
+        finally:
+            base_watcher._reactor.remove_tail(tail)
+
+        logs = watcher.get_logs()
+        self.assertIn("[log] New line", logs)
+        self.assertNotIn("Existing line", logs)
+        self.assertEqual(error, "Error: log failure")
+
+    def test_monitor_log_file_rotation(self):
+        """Test that tailing follows a log file to the new file at its path after rotation"""
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        log_path = os.path.join(log_dir.name, "app.log")
+        with open(log_path, 'w') as f:
+            f.write("Before rotation\n")
+
+        watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+        tail = watcher.monitor_log_file(log_path)
+        self.addCleanup(base_watcher._reactor.remove_tail, tail)
+
+        with open(log_path, 'a') as f:
+            f.write("Error: old file\n")
+        self.assertEqual(watcher._error_queue.get(timeout=5), "Error: old file")
+
+        os.rename(log_path, log_path + ".1")
+        with open(log_path, 'w') as f:
+            f.write("Error: new file\n")
+        self.assertEqual(watcher._error_queue.get(timeout=5), "Error: new file")
+
+    def test_attached_watchers_share_monitor_thread(self):
+        """Test that attached processes are all monitored by one shared thread"""
+        watchers = []
+        for _ in range(2):
+            proc = subprocess.Popen([_PY, "-c", "import time; time.sleep(30)"])
+            self.addCleanup(proc.wait)
+            self.addCleanup(proc.kill)
+            watcher = base_watcher.BaseWatcher(process_target="fake command", buffer_size=50)
+            watcher.attach_to_process(proc.pid)
+            self.assertTrue(watcher.is_attached)
+            watchers.append(watcher)
+
+        monitor_threads = [t for t in threading.enumerate() if t.name == "watchmin-attached"]
+        self.assertEqual(len(monitor_threads), 1)
+
+        # Stopping a watcher ends its monitoring without touching the others
+        watchers[0].stop()
+        self.assertTrue(watchers[0]._attached_done.wait(timeout=5))
+        self.assertFalse(watchers[1]._attached_done.is_set())
+        watchers[1].stop()
+        self.assertTrue(watchers[1]._attached_done.wait(timeout=5))
+
 class TestMainFunctions(unittest.TestCase):
     """Tests for functions in main.py"""
     
     def setUp(self):
         """Set up test environment"""
-        # Import the module to ensure it's loaded
-        import main
-        
         # Store the original active_watchers
         self.original_active_watchers = dict(main.active_watchers)
         # Clear active_watchers for tests
@@ -177,7 +503,6 @@ print("Test script completed")
     def tearDown(self):
         """Clean up after tests"""
         # Restore original active_watchers
-        import main
         main.active_watchers.clear()
         main.active_watchers.update(self.original_active_watchers)
         
@@ -190,10 +515,7 @@ print("Test script completed")
     def test_watch_new_process(self):
         """Test creating a watcher for a new process"""
         # Create a command that will run for a little while
-        cmd = f"{sys.executable} {self.script_path}"
-        
-        # Import here to make sure we use the patched version
-        from main import watch_new_process
+        cmd = f"{_PY} {self.script_path}"
         
         # Watch the process
         watcher_id = watch_new_process(cmd)
@@ -202,7 +524,6 @@ print("Test script completed")
         self.assertIsNotNone(watcher_id)
         
         # Get the watcher
-        import main
         self.assertTrue(watcher_id in main.active_watchers)
         watcher = main.active_watchers[watcher_id]
         
@@ -211,28 +532,24 @@ print("Test script completed")
         self.assertFalse(watcher.is_attached)
         
         # Clean up
-        from main import stop_watcher
         stop_watcher(watcher_id)
     
     def test_stop_watcher(self):
         """Test stopping a watcher"""
-        # Create a command that will run for a little while
-        cmd = f"{sys.executable} -c \"import time; time.sleep(2)\""
-        
-        # Import here to make sure we use the patched version
-        from main import watch_new_process, stop_watcher
+        fake_process = make_fake_process(running=True)
         
         # Watch the process
-        watcher_id = watch_new_process(cmd)
+        with patch('watchers.base_watcher.subprocess.Popen', return_value=fake_process):
+            watcher_id = watch_new_process("fake command")
         
         # Check that a watcher was created
-        import main
         self.assertTrue(watcher_id in main.active_watchers)
         
         # Stop the watcher
         stop_watcher(watcher_id)
         
-        # Check that the watcher was removed
+        # Check that the process was terminated and the watcher was removed
+        fake_process.terminate.assert_called_once()
         self.assertFalse(watcher_id in main.active_watchers)
 
 class TestToolsHandler(unittest.TestCase):
@@ -274,6 +591,30 @@ class TestToolsHandler(unittest.TestCase):
         self.assertFalse(result["success"])
         self.assertNotEqual(result["returncode"], 0)
     
+    @unittest.skipIf(sys.platform == 'win32', "Uses POSIX shell syntax")
+    def test_run_shell_command_skips_shell_when_possible(self):
+        """Test that only commands using shell syntax are run through the shell"""
+        self.assertEqual(tools_handler._command_argv("echo 'Hello World'", False), ["echo", "Hello World"])
+        for cmd in ("echo hi | tr a-z A-Z", "ls *.py", "FOO=1 env", "echo 'unbalanced"):
+            self.assertEqual(tools_handler._command_argv(cmd, False), ["/bin/sh", "-c", cmd])
+        self.assertEqual(tools_handler._command_argv("echo hi", True), ["/bin/sh", "-c", "echo hi"])
+
+        result = self.tools_handler.run_shell_command("echo hi | tr a-z A-Z", 5)
+        self.assertEqual(result["stdout"], "HI\n")
+
+        # A missing program still gets the shell's exit status and message
+        result = self.tools_handler.run_shell_command("thiscommandprobablydoesnotexist xyz", 5)
+        self.assertEqual(result["returncode"], 127)
+        self.assertIn("not found", result["stderr"])
+
+    @unittest.skipIf(sys.platform == 'win32', "Uses POSIX shell syntax")
+    def test_run_shell_command_restores_sigpipe(self):
+        """Test that a pipeline whose reader exits early ends quietly, as under a shell"""
+        result = self.tools_handler.run_shell_command("yes | head -1", 5)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["stdout"], "y\n")
+        self.assertEqual(result["stderr"], "")
+
     def test_run_shell_command_timeout(self):
         """Test shell command timeout"""
         if sys.platform == 'win32':
@@ -310,7 +651,56 @@ class TestToolsHandler(unittest.TestCase):
         
         self.assertFalse(result["success"])
         self.assertIn("timed out", result["error"])
-    
+
+    @unittest.skipUnless(tools_handler._HAS_FORK_SERVER, "needs fork and descriptor passing")
+    def test_run_python_code_restarts_worker(self):
+        """Test that code still runs after the warm Python worker dies"""
+        self.assertTrue(self.tools_handler.run_python_code("print('first')", 5)["success"])
+        worker = tools_handler._python_fork_server._process
+        worker.kill()
+        worker.wait()
+
+        result = self.tools_handler.run_python_code("print('second')", 5)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["stdout"], "second\n")
+        self.assertIsNot(tools_handler._python_fork_server._process, worker)
+
+    @unittest.skipIf(sys.platform == 'win32', "Uses the sleep command")
+    def test_run_python_code_timeout_with_background_process(self):
+        """Test that code leaving a process holding its output open runs once and times out"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+            counter = f.name
+        self.addCleanup(os.unlink, counter)
+        code = (
+            "import subprocess\n"
+            f"open({counter!r}, 'a').write('ran\\n')\n"
+            "subprocess.Popen(['sleep', '3'])\n"
+        )
+
+        result = self.tools_handler.run_python_code(code, 1)
+
+        self.assertFalse(result["success"])
+        self.assertIn("timed out", result["error"])
+        with open(counter) as f:
+            self.assertEqual(f.read(), "ran\n")
+
+    def test_run_python_code_behaves_like_a_script(self):
+        """Test that the code gets its own __main__ and its threads finish before exit"""
+        code = (
+            "import pickle, threading, time\n"
+            "class A: pass\n"
+            "print(len(pickle.dumps(A())) > 0)\n"
+            "def late():\n"
+            "    time.sleep(0.2)\n"
+            "    print('from thread')\n"
+            "threading.Thread(target=late).start()\n"
+            "print('main done')\n"
+        )
+        result = self.tools_handler.run_python_code(code, 5)
+
+        self.assertTrue(result["success"], result["stderr"])
+        self.assertEqual(result["stdout"], "True\nmain done\nfrom thread\n")
+
     def test_mark_as_fixed_true(self):
         """Test marking as fixed"""
         result = self.tools_handler.mark_as_fixed(True)
@@ -345,6 +735,46 @@ class TestToolsHandler(unittest.TestCase):
         self.assertEqual(result["total_lines"], 5)
         self.assertEqual(result["lines_read"], 3)
     
+    def test_read_file_whole_file(self):
+        """Test reading a whole file, with and without a final newline"""
+        result = self.tools_handler.read_file(self.test_file_path, 0, -1)
+        self.assertEqual(result["content"], "Line 1\nLine 2\nLine 3\nLine 4\nLine 5\n")
+        self.assertEqual(result["total_lines"], 5)
+        self.assertEqual(result["lines_read"], 5)
+
+        with open(self.test_file_path, 'w') as f:
+            f.write("Line 1\r\nLine 2")
+        result = self.tools_handler.read_file(self.test_file_path, 0, -1)
+        self.assertEqual(result["content"], "Line 1\nLine 2")
+        self.assertEqual(result["total_lines"], 2)
+        self.assertEqual(result["lines_read"], 2)
+
+    def test_read_file_after_edit(self):
+        """Test reading a file that was just edited"""
+        self.tools_handler.read_file(self.test_file_path, 0, -1)
+        self.tools_handler.edit_file(self.test_file_path, 0, 0, "Line 0\nLine 1")
+        result = self.tools_handler.read_file(self.test_file_path, 1, 2)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["content"], "Line 1\nLine 2\n")
+        self.assertEqual(result["total_lines"], 6)
+        self.assertEqual(result["lines_read"], 2)
+
+    def test_line_offset_cache_is_bounded(self):
+        """Test that only the most recently used files keep their line offsets cached"""
+        paths = []
+        for i in range(3):
+            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as f:
+                f.write(f"File {i}\n")
+            self.addCleanup(os.unlink, f.name)
+            paths.append(f.name)
+
+        with patch('watchers.fixers.tools_handler.OFFSET_CACHE_SIZE', 2):
+            for path in paths:
+                self.assertEqual(self.tools_handler.read_file(path, 0, 0)["content"], f"File {paths.index(path)}\n")
+        self.assertNotIn(paths[0], tools_handler._offset_cache)
+        self.assertIn(paths[2], tools_handler._offset_cache)
+
     def test_read_file_not_found(self):
         """Test reading a nonexistent file"""
         result = self.tools_handler.read_file("nonexistent_file.txt", 0, 5)
@@ -365,7 +795,71 @@ class TestToolsHandler(unittest.TestCase):
         
         expected_content = "Line 1\nNew Line 2\nNew Line 3\nNew Line 4\nLine 5\n"
         self.assertEqual(content, expected_content)
-    
+
+    def test_edit_file_repeated_edits(self):
+        """Test that consecutive edits address lines in the updated file"""
+        self.tools_handler.edit_file(self.test_file_path, 1, 1, "Line 2a\nLine 2b")
+        result = self.tools_handler.edit_file(self.test_file_path, 4, 4, "New Line 4")
+
+        self.assertTrue(result["success"])
+
+        # Verify file contents
+        with open(self.test_file_path, 'r') as f:
+            content = f.read()
+
+        expected_content = "Line 1\nLine 2a\nLine 2b\nLine 3\nNew Line 4\nLine 5\n"
+        self.assertEqual(content, expected_content)
+
+    def test_edit_file_splits_new_content_on_newlines_only(self):
+        """Test that \\r and form feeds in new content do not start new lines"""
+        result = self.tools_handler.edit_file(self.test_file_path, 1, 1, "a\rb\x0cc\n")
+        self.assertEqual(result["new_lines_count"], 1)
+
+        self.tools_handler.edit_file(self.test_file_path, 2, 2, "New Line 3")
+        with open(self.test_file_path, 'rb') as f:
+            content = f.read()
+        self.assertEqual(content, b"Line 1\na\rb\x0cc\nNew Line 3\nLine 4\nLine 5\n")
+
+    @unittest.skipUnless(tools_handler._HAS_SENDFILE, "sendfile is not used on this platform")
+    def test_edit_file_without_sendfile_support(self):
+        """Test that edits still work on filesystems that refuse sendfile"""
+        import errno
+        with patch('watchers.fixers.tools_handler.os.sendfile', side_effect=OSError(errno.EINVAL, "Invalid argument")):
+            result = self.tools_handler.edit_file(self.test_file_path, 1, 1, "New Line 2")
+
+        self.assertTrue(result["success"])
+        with open(self.test_file_path, 'r') as f:
+            self.assertEqual(f.read(), "Line 1\nNew Line 2\nLine 3\nLine 4\nLine 5\n")
+
+    @unittest.skipIf(sys.platform == 'win32', "Symlinks need extra privileges on Windows")
+    def test_edit_file_through_symlink(self):
+        """Test that editing through a symlink edits its target and keeps the link"""
+        link_path = self.test_file_path + ".link"
+        os.symlink(self.test_file_path, link_path)
+        self.addCleanup(os.unlink, link_path)
+
+        result = self.tools_handler.edit_file(link_path, 1, 1, "New Line 2")
+
+        self.assertTrue(result["success"])
+        self.assertTrue(os.path.islink(link_path))
+        with open(self.test_file_path, 'r') as f:
+            self.assertEqual(f.read(), "Line 1\nNew Line 2\nLine 3\nLine 4\nLine 5\n")
+
+    def test_edit_file_failure_keeps_original(self):
+        """Test that a failed edit leaves the file and directory as they were"""
+        with open(self.test_file_path, 'rb') as f:
+            original = f.read()
+        directory = os.path.dirname(os.path.abspath(self.test_file_path))
+        before = set(os.listdir(directory))
+
+        with patch('watchers.fixers.tools_handler.os.fsync', side_effect=OSError("disk full")):
+            result = self.tools_handler.edit_file(self.test_file_path, 1, 1, "New Line 2")
+
+        self.assertFalse(result["success"])
+        with open(self.test_file_path, 'rb') as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual(set(os.listdir(directory)), before)
+
     def test_edit_file_not_found(self):
         """Test editing a nonexistent file"""
         result = self.tools_handler.edit_file("nonexistent_file.txt", 0, 5, "New content")
@@ -553,6 +1047,97 @@ class TestBaseFixer(unittest.TestCase):
             self.assertTrue(self.fixer.isfixed)
             self.assertTrue(result)
     
+    def _tool_call_response(self, name, arguments):
+        """Build a mock completion whose message makes a single tool call"""
+        mock_tool_call = MagicMock()
+        mock_tool_call.id = f"call_{name}"
+        mock_tool_call.function.name = name
+        mock_tool_call.function.arguments = json.dumps(arguments)
+        mock_message = MagicMock()
+        mock_message.content = None
+        mock_message.tool_calls = [mock_tool_call]
+        return MagicMock(choices=[MagicMock(message=mock_message)])
+
+    def test_fix_resumes_after_readonly_tools(self):
+        """Test that read-only tool results are sent back within the same turn"""
+        read = self._tool_call_response("read_file", {"file_path": self.test_file_path, "line_start": 1, "line_end": 2})
+        fixed = self._tool_call_response("mark_as_fixed", {"fixed": True})
+        create = self.fixer.oai_client.chat.completions.create
+        create.side_effect = [read, fixed]
+
+        self.assertTrue(self.fixer.fix(error="error", logs="logs", relevant_code="code"))
+        self.assertEqual(create.call_count, 2)
+
+        # Further read-only responses are capped at READONLY_ROUNDS per turn
+        self.fixer.reset()
+        create.reset_mock(side_effect=True)
+        create.return_value = read
+        self.assertFalse(self.fixer.fix(error="error", logs="logs", relevant_code="code"))
+        self.assertEqual(create.call_count, base_fixer.READONLY_ROUNDS + 1)
+
+    def test_fix_runs_readonly_tools_concurrently(self):
+        """Test that several read-only calls in one response run at the same time"""
+        read = self._tool_call_response("read_file", {"file_path": self.test_file_path, "line_start": 1, "line_end": 2})
+        fixed = self._tool_call_response("mark_as_fixed", {"fixed": True})
+        calls = [read.choices[0].message.tool_calls[0]] * 3 + [fixed.choices[0].message.tool_calls[0]]
+        read.choices[0].message.tool_calls = calls
+        self.fixer.oai_client.chat.completions.create.return_value = read
+
+        # Each read waits for the other two, so this only passes if they overlap
+        barrier = threading.Barrier(3, timeout=5)
+        order = []
+        def execute_tool(function_name, args):
+            if function_name == "read_file":
+                barrier.wait()
+            order.append(function_name)
+            return {"success": True}
+
+        with patch.object(self.fixer, '_execute_tool', side_effect=execute_tool):
+            self.assertTrue(self.fixer.fix(error="error", logs="logs", relevant_code="code"))
+
+        self.assertEqual(order, ["read_file"] * 3 + ["mark_as_fixed"])
+        tool_messages = [m for m in self.fixer.messages if m["role"] == "tool"]
+        self.assertEqual(len(tool_messages), 4)
+
+    def test_fix_runs_shell_commands_in_order(self):
+        """Test that shell commands in one response run one after another, not on the pool"""
+        install = self._tool_call_response("run_shell_command", {"command": "pip install foo", "timeout": 5})
+        check = self._tool_call_response("run_shell_command", {"command": "pip show foo", "timeout": 5})
+        install.choices[0].message.tool_calls = install.choices[0].message.tool_calls + check.choices[0].message.tool_calls
+        self.fixer.oai_client.chat.completions.create.return_value = install
+
+        calls = []
+        def execute_tool(function_name, args):
+            calls.append((args["command"], threading.current_thread() is threading.main_thread()))
+            return {"success": True}
+
+        with patch.object(self.fixer, '_execute_tool', side_effect=execute_tool):
+            self.fixer.fix(error="error", logs="logs", relevant_code="code")
+
+        self.assertEqual(calls[:2], [("pip install foo", True), ("pip show foo", True)])
+
+    def test_fix_trims_transcript(self):
+        """Test that only the latest exchanges are sent in full once the transcript grows"""
+        read = self._tool_call_response("read_file", {"file_path": self.test_file_path, "line_start": 1, "line_end": 2})
+        # The messages list keeps changing after each call, so snapshot what was sent
+        sent_messages = []
+        def create(**kwargs):
+            sent_messages.append(list(kwargs["messages"]))
+            return read
+        self.fixer.oai_client.chat.completions.create.side_effect = create
+
+        for _ in range(3):
+            self.fixer.fix(error="error", logs="logs", relevant_code="code")
+
+        self.assertEqual(max(len(messages) for messages in sent_messages), 3 + 2 * base_fixer.TRANSCRIPT_TURNS)
+        sent = sent_messages[-1]
+        self.assertEqual(sent[1]["content"], "Error: error\nLogs: logs\nRelevant Code: code")
+        self.assertTrue(sent[2]["content"].startswith("Prior attempts summary:"))
+        self.assertIn("Called read_file", sent[2]["content"])
+        # The kept tail starts with a tool call, followed by its result
+        self.assertIn("tool_calls", sent[3])
+        self.assertEqual(sent[4]["role"], "tool")
+
     def test_fix_no_tool_calls(self):
         """Test the fix method with no tool calls"""
         # Create a sample error and code
@@ -599,5 +1184,85 @@ class TestBaseFixer(unittest.TestCase):
         self.assertTrue(result2)
     
 
+class TestRelevanceFinder(unittest.TestCase):
+    """Tests for find_relevant_code"""
+
+    def setUp(self):
+        """Set up a mock client that streams a fixed relevance result"""
+        self.mock_config = MockConfigHandler()
+        self.mock_oai_client = MagicMock()
+        self.content = '{"file_path": "/app/main.py", "start_line": 1, "end_line": 2, "has_relevant_file": true}'
+        self.streams = []
+        self.mock_oai_client.chat.completions.create.side_effect = lambda **kwargs: self.make_stream(self.content)
+
+    def make_stream(self, content, trailing=()):
+        """Build a completion stream that yields content in a few pieces, then any trailing text"""
+        pieces = [content[:10], content[10:40], content[40:], *trailing]
+        chunks = [MagicMock(choices=[MagicMock(delta=MagicMock(content=piece))]) for piece in pieces]
+        stream = MagicMock()
+        stream.__iter__.return_value = iter(chunks)
+        self.streams.append(stream)
+        return stream
+
+    def sent_text(self, call=-1):
+        """Get the log text sent to the model in a call"""
+        messages = self.mock_oai_client.chat.completions.create.call_args_list[call][1]["messages"]
+        return messages[-1]["content"][0]["text"]
+
+    def test_long_logs_are_compacted(self):
+        """Test that long logs keep their end and the earlier traceback frames"""
+        logs = ("noise\n" * 10000
+                + 'Traceback (most recent call last):\n  File "/app/main.py", line 12, in <module>\n'
+                + "noise\n" * 10000 + "ValueError: bad\n")
+        find_relevant_code(logs, self.mock_oai_client, self.mock_config)
+
+        text = self.sent_text()
+        self.assertLess(len(text), relavance_finder.MAX_LOG_CHARS + 1000)
+        self.assertIn('File "/app/main.py", line 12', text)
+        self.assertTrue(text.endswith("ValueError: bad\n"))
+
+        # Short logs are sent as they are
+        find_relevant_code("Error: short", self.mock_oai_client, self.mock_config)
+        self.assertEqual(self.sent_text(), "Error: short")
+
+    def test_batch_results_follow_input_order(self):
+        """Test that batched results are matched back to their logs by id"""
+        content = json.dumps({"results": [
+            {"id": 1, "file_path": "/app/b.py", "start_line": 3, "end_line": 4, "has_relevant_file": True},
+            {"id": 0, "file_path": "/app/a.py", "start_line": 1, "end_line": 2, "has_relevant_file": True},
+        ]})
+        self.content = content
+
+        results = relavance_finder.find_relevant_code_batch(["Error: a", "Error: b", "Error: c"], self.mock_oai_client, self.mock_config)
+
+        self.mock_oai_client.chat.completions.create.assert_called_once()
+        self.assertEqual([json.loads(self.sent_text())[i]["logs"] for i in range(3)], ["Error: a", "Error: b", "Error: c"])
+        self.assertEqual([r["file_path"] for r in results], ["/app/a.py", "/app/b.py", ""])
+        self.assertFalse(results[2]["has_relevant_file"])
+
+    def test_batched_logs_keep_traceback_frames(self):
+        """Test that logs in a batch are compacted to the batch budget, keeping earlier frames"""
+        self.content = json.dumps({"results": []})
+        logs = ('Traceback (most recent call last):\n  File "/app/main.py", line 12, in <module>\n'
+                + "noise\n" * 10000 + "ValueError: bad\n")
+
+        relavance_finder.find_relevant_code_batch([logs], self.mock_oai_client, self.mock_config)
+
+        text = json.loads(self.sent_text())[0]["logs"]
+        self.assertLess(len(text), relavance_finder.BATCH_LOG_CHARS + 1000)
+        self.assertIn('File "/app/main.py", line 12', text)
+        self.assertTrue(text.endswith("ValueError: bad\n"))
+
+    def test_stream_stops_at_complete_answer(self):
+        """Test that the stream is dropped once the JSON answer is complete"""
+        self.mock_oai_client.chat.completions.create.side_effect = lambda **kwargs: self.make_stream(self.content, ["\n", " ignored"])
+
+        result = find_relevant_code("Error: boom", self.mock_oai_client, self.mock_config)
+
+        self.assertEqual(result, self.content)
+        self.assertTrue(self.mock_oai_client.chat.completions.create.call_args[1]["stream"])
+        self.streams[-1].close.assert_called_once()
+
+
 if __name__ == '__main__':
     unittest.main()
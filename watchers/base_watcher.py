@@ -1,22 +1,537 @@
 import os
+import re
+import ctypes
 import sys
-import psutil
+import queue
+import selectors
+import shlex
+import struct
 import subprocess
 import threading
 import time
-from collections import deque
 import json
+import mmap
+import hashlib
+import itertools
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+try:
+    # orjson parses several times faster; the standard library is the fallback
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 from watchers.fixers.base_fixer import BaseFixer
-from watchers.subwatchers.relavance_finder import find_relevant_code
+from watchers.fixers.tools_handler import _split_command
+from watchers.subwatchers.relavance_finder import find_relevant_code, find_relevant_code_batch
 
-# Global dictionary to store output lines for each process
-process_output_buffers = {}
+# Live watchers by process target (or PID when attached), for the legacy
+# module-level get_logs. Entries disappear once a watcher is garbage collected
+_watcher_registry = weakref.WeakValueDictionary()
+_registry_lock = threading.Lock()
 # Default max lines to store in buffer
 DEFAULT_BUFFER_SIZE = 100
 # Default maximum number of turns for LLM interactions
 DEFAULT_MAX_TURNS = 20
+# Default seconds after a repair starts during which further errors don't start another
+DEFAULT_REPAIR_COOLDOWN = 30
+# Repairs that can wait for the repair worker before new ones are dropped
+REPAIR_QUEUE_SIZE = 4
+# Seconds a repair waits after its error before taking the process's logs, so
+# the lines that follow the error (the rest of a traceback) are included
+REPAIR_SETTLE_SECONDS = 0.5
+# find_relevant_code results each watcher keeps for logs it has already seen
+RELEVANCE_CACHE_SIZE = 64
+# Bytes requested per read from a process pipe or log file
+READ_CHUNK_SIZE = 65536
+# A line longer than this is handed on as it is rather than held for its end
+MAX_PARTIAL_LINE = READ_CHUNK_SIZE
+# Most log files tailed for one attached process
+MAX_LOG_FILES = 64
+# Open files count as logs when they end in one of these or sit in a log directory
+LOG_SUFFIXES = ('.log', '.out', '.err', '.trace')
+# Seconds between checks of tailed log files for new data
+LOG_POLL_INTERVAL = 0.1
+# Keywords that mark a line of output as an error, compiled once for all watchers.
+# Matched against raw bytes so lines are only decoded when they're read back
+DEFAULT_ERROR_KEYWORDS = ("error", "exception", "traceback", "panic", "fatal")
+
+@lru_cache(maxsize=None)
+def _error_matcher(keywords):
+    """
+    Compile a set of error keywords, once for every watcher that uses them.
+    
+    Args:
+        keywords (tuple): The keywords, matched case-insensitively
+        
+    Returns:
+        tuple: The lowercased keywords as bytes and the pattern matching any of them
+    """
+    encoded = tuple(keyword.lower().encode('utf-8') for keyword in keywords if keyword)
+    if not encoded:
+        # A pattern that never matches, for when error detection is configured off
+        return encoded, re.compile(b'(?!)')
+    return encoded, re.compile(b'|'.join(map(re.escape, encoded)), re.IGNORECASE)
+
+_ERROR_KEYWORDS, _ERROR_PATTERN = _error_matcher(DEFAULT_ERROR_KEYWORDS)
+
+def _error_lines(data, keywords=_ERROR_KEYWORDS, pattern=_ERROR_PATTERN):
+    """
+    Find the lines in a block of output that match an error pattern.
+    
+    Most blocks hold no error at all, so the block is first lowercased once
+    and each keyword looked for with a plain substring search, which runs
+    many times faster than the regex over the same bytes. Only blocks that
+    contain a keyword are scanned with the pattern to pick out the lines;
+    each matching line is returned once, however many keywords it holds.
+    
+    Args:
+        data: Complete lines of raw output joined by newlines
+        keywords: Lowercased keywords as bytes, from _error_matcher
+        pattern: The compiled pattern for the same keywords
+        
+    Returns:
+        list: The matching lines as bytes, in order
+    """
+    lowered = data.lower()
+    if not any(keyword in lowered for keyword in keywords):
+        return []
+    
+    lines = []
+    pos = 0
+    while True:
+        match = pattern.search(data, pos)
+        if match is None:
+            return lines
+        line_start = data.rfind(b'\n', 0, match.start()) + 1
+        line_end = data.find(b'\n', match.end())
+        if line_end == -1:
+            line_end = len(data)
+        lines.append(data[line_start:line_end])
+        pos = line_end + 1
+
+def _take_lines(partial, chunk):
+    """
+    Add a chunk of raw output to a partial line and take the complete lines.
+    
+    As with a text-mode pipe, \r\n and a lone \r both end a line, so output
+    that redraws itself with \r (progress bars) doesn't build up into one
+    endless line. A partial line longer than MAX_PARTIAL_LINE is taken whole.
+    
+    Args:
+        partial: bytearray holding the incomplete last line; updated in place
+        chunk: The bytes just read
+        
+    Returns:
+        bytes: The complete lines joined by newlines, or None if there are none yet
+    """
+    partial += chunk
+    # A trailing \r may be the first half of a \r\n, so it waits for the next chunk
+    end = max(partial.rfind(b'\n'), partial.rfind(b'\r', 0, len(partial) - 1))
+    if end == -1:
+        if len(partial) <= MAX_PARTIAL_LINE:
+            return None
+        end = len(partial)
+    block_end = end - 1 if end and partial[end - 1:end + 1] == b'\r\n' else end
+    block = bytes(partial[:block_end])
+    del partial[:end + 1]
+    if b'\r' in block:
+        block = block.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    return block
+
+def _relevance_key(logs):
+    """Key the relevance cache by a short hash rather than the full logs"""
+    return hashlib.blake2b(logs.encode('utf-8', errors='replace'), digest_size=8).digest()
+
+def _is_log_path(path):
+    """Check whether a file path looks like a log file, going by LOG_SUFFIXES"""
+    return path.endswith(LOG_SUFFIXES) or '/log/' in path
+
+def _render_entry(entry):
+    """Format a buffered (tag, line) entry as '[tag] line'"""
+    tag, line = entry
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace').strip()
+    return f"[{tag}] {line}"
+
+@lru_cache(maxsize=64)
+def _read_code_range(file_path, start_line, end_line, mtime_ns, size):
+    """
+    Read lines start_line..end_line (inclusive) of a file, or "" if out of range.
+    
+    The file's mtime and size are part of the cache key, so a range is read
+    again once the fixer (or anything else) has edited the file. The file is
+    mapped rather than read, and only scanned as far as end_line.
+    """
+    if start_line < 0 or end_line < start_line or not size:
+        return ""
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            for line in range(end_line + 1):
+                if line == start_line:
+                    start_off = pos
+                newline = mm.find(b'\n', pos)
+                if newline == -1:
+                    # Only a final line without a trailing newline is left
+                    if line < end_line or pos >= len(mm):
+                        return ""
+                    pos = len(mm)
+                    break
+                pos = newline + 1
+            return mm[start_off:pos].decode('utf-8').replace('\r\n', '\n')
+
+class _RingBuffer:
+    """
+    Fixed-size buffer of the most recent output lines.
+    
+    Lines are written into a preallocated list at a rolling head index, so
+    reading the tail indexes it directly instead of copying the whole buffer.
+    
+    Writers don't take a lock: each claims its slot with next() on an
+    itertools.count, which the GIL makes atomic, so concurrent writers never
+    share a slot. A reader racing a writer may see a slot's previous line.
+    """
+    def __init__(self, size):
+        self._size = size
+        self._slots = [None] * size
+        # Source of slot indexes for writers
+        self._claim = itertools.count()
+        # Number of lines appended so far, as published to readers
+        self._head = 0
+    
+    def append(self, line):
+        """Add a line, overwriting the oldest one once the buffer is full"""
+        if not self._size:
+            return
+        index = next(self._claim)
+        self._slots[index % self._size] = line
+        # Publish the slot only after it has been written
+        if index >= self._head:
+            self._head = index + 1
+    
+    def extend(self, lines):
+        """Add several lines, publishing them once at the end"""
+        if not self._size or not lines:
+            return
+        for line in lines:
+            index = next(self._claim)
+            self._slots[index % self._size] = line
+        if index >= self._head:
+            self._head = index + 1
+    
+    def extend_block(self, tag, data):
+        """
+        Add the lines of a block of output as (tag, line) entries.
+        
+        Only the lines the buffer can hold are split out of the block, so a
+        large chunk of output doesn't allocate an object for every line just
+        for most of them to be overwritten straight away.
+        
+        Args:
+            tag: Tag stored with each line, such as the stream name
+            data: Complete lines of raw output joined by newlines
+        """
+        lines = data.rsplit(b'\n', self._size)
+        if len(lines) > self._size:
+            del lines[0]
+        self.extend([(tag, line) for line in lines])
+    
+    def tail(self, count):
+        """
+        Get the most recent lines.
+        
+        Args:
+            count: Maximum number of lines to return
+            
+        Returns:
+            list: Up to count lines, oldest first
+        """
+        head = self._head
+        count = min(count, head, self._size)
+        slots = self._slots
+        # A slot claimed by a writer that hasn't stored its line yet is still empty
+        return [line for line in (slots[i % self._size] for i in range(head - count, head))
+                if line is not None]
+    
+    @property
+    def version(self):
+        """Number of lines appended so far; changes whenever the contents do"""
+        return self._head
+    
+    def __len__(self):
+        return min(self._head, self._size)
+    
+    def __iter__(self):
+        return iter(self.tail(self._size))
+
+# inotify wakes the reactor when a tailed file is written to or rotated away,
+# instead of it polling the file. It's Linux-only; elsewhere files are polled
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    _inotify_rm_watch = _libc.inotify_rm_watch
+    _HAS_INOTIFY = True
+except (OSError, AttributeError):
+    _HAS_INOTIFY = False
+_IN_MODIFY = 0x00000002
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000
+# struct inotify_event without its trailing name: wd, mask, cookie, len
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+class _LogTail:
+    """A file tailed by the I/O reactor, followed by path across rotation"""
+    __slots__ = ('path', 'fd', 'offset', 'callback', 'wd')
+    
+    def __init__(self, path, fd, offset, callback):
+        self.path = path
+        self.fd = fd
+        self.offset = offset
+        self.callback = callback
+        # inotify watch descriptor, or None while the file is being polled
+        self.wd = None
+
+class _IOReactor:
+    """
+    Single background thread that reads the output pipes of every watcher.
+    
+    Pipes are registered with one selector (epoll on Linux) instead of each
+    getting a blocking reader thread. Ready data is handed to the callback the
+    pipe was registered with; an empty chunk tells the callback the pipe hit EOF.
+    
+    Tailed log files are read by the same thread with pread at a rolling
+    offset. Regular files can't be waited on with epoll, so an inotify watch
+    on each one wakes the selector when it's written to, moved or deleted; a
+    file that's rotated away is reopened by path. Without inotify, or while
+    a rotated file hasn't been recreated yet, files are polled every
+    LOG_POLL_INTERVAL.
+    """
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._tails = set()
+        self._pending_tails = []
+        # inotify watch descriptor -> tails of that file
+        self._watches = {}
+        self._thread = None
+        # Self-pipe used to interrupt select() when new pipes are registered
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._inotify_fd = -1
+        if _HAS_INOTIFY:
+            self._inotify_fd = _inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if self._inotify_fd >= 0:
+                self._selector.register(self._inotify_fd, selectors.EVENT_READ)
+    
+    def register(self, stream, callback):
+        """
+        Start delivering data read from a stream to a callback.
+        
+        Args:
+            stream: A file object (or file descriptor) to read from
+            callback: Called with each chunk of bytes, then with b'' at EOF
+        """
+        with self._lock:
+            self._pending.append((stream, callback))
+        self._wake()
+    
+    def add_tail(self, fd, offset, callback, path):
+        """
+        Start delivering data appended to a file to a callback.
+        
+        Args:
+            fd: Open file descriptor of the file; the reactor closes it on removal
+            offset: Byte offset to start reading from
+            callback: Called with each chunk of new bytes
+            path: Path of the file, used to reopen it after rotation
+            
+        Returns:
+            _LogTail: Handle to pass to remove_tail
+        """
+        tail = _LogTail(path, fd, offset, callback)
+        with self._lock:
+            self._pending_tails.append((tail, True))
+        self._wake()
+        return tail
+    
+    def remove_tail(self, tail):
+        """Stop tailing a file added with add_tail and close its descriptor"""
+        with self._lock:
+            self._pending_tails.append((tail, False))
+        self._wake()
+    
+    def _wake(self):
+        """Start the reactor thread if needed and interrupt its select()"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watchmin-io")
+                self._thread.daemon = True
+                self._thread.start()
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            # A wakeup is already pending
+            pass
+    
+    def _run(self):
+        """Reactor loop; only this thread touches the selector after __init__"""
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                pending_tails, self._pending_tails = self._pending_tails, []
+            for stream, callback in pending:
+                self._selector.register(stream, selectors.EVENT_READ, callback)
+            for tail, add in pending_tails:
+                if add:
+                    self._tails.add(tail)
+                    self._watch(tail)
+                    # Catch up on anything written before the watch existed
+                    self._read_tail(tail)
+                elif tail in self._tails:
+                    self._tails.discard(tail)
+                    self._unwatch(tail)
+                    if tail.fd is not None:
+                        os.close(tail.fd)
+            
+            polled = [tail for tail in self._tails if tail.wd is None]
+            timeout = LOG_POLL_INTERVAL if polled else None
+            for key, _ in self._selector.select(timeout):
+                if key.fd == self._wakeup_r:
+                    try:
+                        while os.read(self._wakeup_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                if key.fd == self._inotify_fd:
+                    self._handle_inotify()
+                    continue
+                
+                try:
+                    data = os.read(key.fd, READ_CHUNK_SIZE)
+                except OSError:
+                    data = b''
+                if not data:
+                    self._selector.unregister(key.fileobj)
+                
+                try:
+                    key.data(data)
+                except Exception as e:
+                    print(f"Error handling watcher output: {e}")
+            
+            for tail in polled:
+                if tail.fd is None:
+                    self._reopen(tail)
+                elif tail in self._tails:
+                    self._read_tail(tail)
+    
+    def _watch(self, tail):
+        """Add an inotify watch for a tailed file, if inotify is available"""
+        if self._inotify_fd < 0:
+            return
+        wd = _inotify_add_watch(self._inotify_fd, os.fsencode(tail.path),
+                                _IN_MODIFY | _IN_MOVE_SELF | _IN_DELETE_SELF)
+        if wd >= 0:
+            tail.wd = wd
+            # Watching the same file twice yields the same descriptor
+            self._watches.setdefault(wd, set()).add(tail)
+    
+    def _unwatch(self, tail):
+        """Remove a tailed file's inotify watch once no other tail shares it"""
+        if tail.wd is None:
+            return
+        tails = self._watches.get(tail.wd)
+        if tails is not None:
+            tails.discard(tail)
+            if not tails:
+                del self._watches[tail.wd]
+                # Fails harmlessly if the kernel already dropped the watch
+                _inotify_rm_watch(self._inotify_fd, tail.wd)
+        tail.wd = None
+    
+    def _handle_inotify(self):
+        """
+        Read pending inotify events and service the files they name.
+        
+        A busy file queues an IN_MODIFY per write, so events are collected
+        first and each file is read once for the whole batch.
+        """
+        try:
+            data = os.read(self._inotify_fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        modified = {}
+        rotated = {}
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(data, pos)
+            pos += _INOTIFY_EVENT.size + name_len
+            for tail in self._watches.get(wd, ()):
+                if mask & (_IN_MOVE_SELF | _IN_DELETE_SELF | _IN_IGNORED):
+                    rotated[tail] = None
+                elif mask & _IN_MODIFY:
+                    modified[tail] = None
+        
+        for tail in modified:
+            if tail not in rotated:
+                self._read_tail(tail)
+        for tail in rotated:
+            # Rotated away: finish the old file, then follow the path
+            self._read_tail(tail)
+            self._unwatch(tail)
+            os.close(tail.fd)
+            tail.fd = None
+            self._reopen(tail)
+    
+    def _reopen(self, tail):
+        """Start tailing the file now at a rotated file's path from the beginning"""
+        try:
+            tail.fd = os.open(tail.path, os.O_RDONLY)
+        except OSError:
+            # Not recreated yet; polled until it is
+            return
+        tail.offset = 0
+        self._watch(tail)
+        self._read_tail(tail)
+    
+    def _read_tail(self, tail):
+        """Read whatever has been appended to a tailed file since the last read"""
+        try:
+            data = os.pread(tail.fd, READ_CHUNK_SIZE, tail.offset)
+            if not data and tail.offset and os.fstat(tail.fd).st_size < tail.offset:
+                # Truncated in place (copytruncate rotation); start over
+                tail.offset = 0
+                data = os.pread(tail.fd, READ_CHUNK_SIZE, 0)
+            while data:
+                tail.offset += len(data)
+                tail.callback(data)
+                if len(data) < READ_CHUNK_SIZE:
+                    break
+                data = os.pread(tail.fd, READ_CHUNK_SIZE, tail.offset)
+        except Exception as e:
+            print(f"Error handling log file output: {e}")
+
+# Shared by all watchers; its thread starts with the first registered pipe
+_reactor = _IOReactor()
 
 class BaseWatcher:
+    # Repairs from every watcher run one at a time on a single worker thread,
+    # so the threads reading process output never block on the LLM
+    _repair_queue = queue.Queue(maxsize=REPAIR_QUEUE_SIZE)
+    _repair_worker = None
+    _repair_worker_lock = threading.Lock()
+    # Attached processes are likewise all monitored by one thread
+    _monitors_cond = threading.Condition()
+    _pending_monitors = []
+    _monitor_thread = None
+    
     def __init__(self, process_target=None, buffer_size=None, pid=None, max_turns=None, config_handler=None, oai_client=None):
         """
         Initialize a watcher for a specific process.
@@ -29,6 +544,12 @@ class BaseWatcher:
             config_handler: Configuration handler instance
             oai_client: OpenAI client instance
         """
+        # Commands that need no shell are split once here and exec'd directly
+        if isinstance(process_target, (list, tuple)):
+            self._argv = list(process_target)
+            process_target = shlex.join(self._argv)
+        else:
+            self._argv = _split_command(process_target) if process_target else None
         self.process_target = process_target
         self.pid = pid
         self.config_handler = config_handler
@@ -54,13 +575,61 @@ class BaseWatcher:
             except (AttributeError, KeyError):
                 max_turns = DEFAULT_MAX_TURNS
                 
+        # One error usually prints several matching lines (a traceback, say),
+        # so repairs are started at most once per cooldown window
+        try:
+            if self.config_handler:
+                self._repair_cooldown = self.config_handler.get_value("repair_cooldown_s", DEFAULT_REPAIR_COOLDOWN)
+            else:
+                self._repair_cooldown = DEFAULT_REPAIR_COOLDOWN
+        except (AttributeError, KeyError):
+            self._repair_cooldown = DEFAULT_REPAIR_COOLDOWN
+        self._last_repair_ts = None
+        # Watchers configured with the same keywords share one compiled pattern
+        try:
+            if self.config_handler:
+                error_keywords = self.config_handler.get_value("error_keywords", DEFAULT_ERROR_KEYWORDS)
+            else:
+                error_keywords = DEFAULT_ERROR_KEYWORDS
+        except (AttributeError, KeyError):
+            error_keywords = DEFAULT_ERROR_KEYWORDS
+        self._error_keywords, self._error_pattern = _error_matcher(tuple(error_keywords))
+        # Repairs queued or running for this watcher, and repairs dropped
+        # because the queue was full
+        self._pending_repairs = 0
+        self._repairs_done = threading.Condition()
+        self._dropped_repairs = 0
+        # The fixer is built on the first repair and reset for each one after it
+        self._fixer = None
+        # Parsed find_relevant_code results keyed by a hash of the logs
+        self._relevance_cache = OrderedDict()
+                
         self.buffer_size = buffer_size
         self.max_turns = max_turns
-        self.output_buffer = deque(maxlen=buffer_size)
+        
+        # Resolve the default number of lines get_logs returns once, here,
+        # rather than on every call
+        try:
+            if self.config_handler:
+                self._log_lines = self.config_handler.get_value("lines_of_logs_to_give_llm", buffer_size)
+            else:
+                self._log_lines = buffer_size
+        except (AttributeError, KeyError):
+            self._log_lines = buffer_size
+        self.output_buffer = _RingBuffer(buffer_size)
+        # Last get_logs result as (buffer version, line count, text)
+        self._logs_cache = None
         self.process = None
-        self.stdout_thread = None
-        self.stderr_thread = None
-        self.monitor_thread = None
+        # Set once monitoring of an attached process has finished
+        self._attached_done = threading.Event()
+        # Partial trailing line per stream, waiting for its newline
+        self._partial_lines = {}
+        # Output pipes not yet at EOF, and an event set once all have closed
+        self._open_streams = 0
+        self._streams_lock = threading.Lock()
+        self._streams_closed = threading.Event()
+        # Errors found by the log-file tailer, repaired by the attached-process monitor
+        self._error_queue = queue.SimpleQueue()
         self.is_attached = False
         self.should_stop = False
         
@@ -68,7 +637,112 @@ class BaseWatcher:
         if pid:
             self.attach_to_process(pid)
     
-    def start_repair(self, error, logs):
+    def start_repair(self, error, logs=None):
+        """
+        Queue a repair for an error detected in the watched process.
+        
+        The repair runs on the shared repair worker thread. If the queue is
+        already full the error is dropped and counted in _dropped_repairs.
+        
+        Args:
+            error: The error message detected
+            logs: Recent logs from the process, or None to take the watcher's
+                logs REPAIR_SETTLE_SECONDS after the error, when the repair runs
+        """
+        cls = BaseWatcher
+        with cls._repair_worker_lock:
+            if cls._repair_worker is None:
+                cls._repair_worker = threading.Thread(target=cls._run_repairs, name="watchmin-repair")
+                cls._repair_worker.daemon = True
+                cls._repair_worker.start()
+        
+        with self._repairs_done:
+            self._pending_repairs += 1
+        try:
+            cls._repair_queue.put_nowait((error, logs, self, time.monotonic()))
+        except queue.Full:
+            self._dropped_repairs += 1
+            self._finish_repair()
+            print(f"Warning: Repair queue is full, dropping repair for error: {error}")
+    
+    @staticmethod
+    def _run_repairs():
+        """
+        Repair worker loop; runs queued repairs one at a time.
+        
+        Repairs already waiting when the worker takes one are taken with it,
+        so their relevant code can be looked up in a single request.
+        """
+        repair_queue = BaseWatcher._repair_queue
+        while True:
+            entries = [repair_queue.get()]
+            while True:
+                try:
+                    entries.append(repair_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # Repairs without logs take them once the output after their error
+            # has had time to arrive
+            settled = max((queued_at for _, logs, _, queued_at in entries if logs is None), default=None)
+            if settled is not None:
+                delay = settled + REPAIR_SETTLE_SECONDS - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            batch = [(error, watcher.get_logs() if logs is None else logs, watcher)
+                     for error, logs, watcher, _ in entries]
+            if len(batch) > 1:
+                BaseWatcher._prefetch_relevance(batch)
+            
+            for error, logs, watcher in batch:
+                try:
+                    watcher._do_repair(error, logs)
+                except Exception as e:
+                    print(f"Error during repair process: {e}")
+                finally:
+                    watcher._finish_repair()
+    
+    @staticmethod
+    def _prefetch_relevance(batch):
+        """
+        Look up the relevant code for several queued repairs at once.
+        
+        Lookups that share a client and config are sent as one batched request
+        and the results cached on each watcher, where _do_repair will find them.
+        A lookup that fails here is simply made again by _do_repair.
+        
+        Args:
+            batch: (error, logs, watcher) tuples from the repair queue
+        """
+        groups = {}
+        for error, logs, watcher in batch:
+            if not watcher.config_handler or not watcher._load_oai_client():
+                continue
+            key = _relevance_key(logs)
+            if key not in watcher._relevance_cache:
+                group = groups.setdefault((id(watcher.oai_client), id(watcher.config_handler)), [])
+                group.append((watcher, key, logs))
+        
+        for group in groups.values():
+            # A lone lookup gains nothing from batching
+            if len(group) < 2:
+                continue
+            watcher = group[0][0]
+            try:
+                results = find_relevant_code_batch([logs for _, _, logs in group], watcher.oai_client, watcher.config_handler)
+            except Exception as e:
+                print(f"Error finding relevant code for queued repairs: {e}")
+                continue
+            for (watcher, key, _), relevance_data in zip(group, results):
+                watcher._cache_relevance(key, relevance_data)
+    
+    def _finish_repair(self):
+        """Mark one of this watcher's repairs as no longer pending"""
+        with self._repairs_done:
+            self._pending_repairs -= 1
+            self._repairs_done.notify_all()
+    
+    def _do_repair(self, error, logs):
         """
         Handle errors detected in the watched process by attempting repairs
         
@@ -93,22 +767,20 @@ class BaseWatcher:
             return
             
         # Lazy-load OpenAI client if not provided
-        if not self.oai_client:
-            try:
-                # Import here to avoid circular dependency
-                import main
-                self.oai_client = main.get_oai_client()
-            except Exception as e:
-                print(f"Warning: Cannot load OpenAI client for repair: {e}")
-                return
+        if not self._load_oai_client():
+            return
         
         # Find relevant code for the error
         try:
-            relevance_data = json.loads(find_relevant_code(logs, self.oai_client, self.config_handler))
+            relevance_data = self._find_relevant_code(logs)
             print(f"Found relevant code: {relevance_data}")
             
-            # Create a fixer instance
-            fixer = BaseFixer(self.process_target, process_id, self.config_handler, self.oai_client)
+            # Reuse this watcher's fixer, starting a fresh conversation
+            if self._fixer is None:
+                self._fixer = BaseFixer(self.process_target, process_id, self.config_handler, self.oai_client)
+            else:
+                self._fixer.reset(process_id)
+            fixer = self._fixer
             
             # If we have relevant code, read it
             relevant_code = ""
@@ -118,10 +790,8 @@ class BaseWatcher:
                 end_line = relevance_data.get("end_line")
                 
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        if start_line >= 0 and end_line < len(lines):
-                            relevant_code = ''.join(lines[start_line:end_line+1])
+                    st = os.stat(file_path)
+                    relevant_code = _read_code_range(file_path, start_line, end_line, st.st_mtime_ns, st.st_size)
                 except Exception as e:
                     print(f"Error reading relevant code: {e}")
             
@@ -152,6 +822,67 @@ class BaseWatcher:
             import traceback
             traceback.print_exc()
     
+    def _load_oai_client(self):
+        """
+        Load the shared OpenAI client if this watcher wasn't given one.
+        
+        Returns:
+            bool: True if the watcher has a client
+        """
+        if not self.oai_client:
+            try:
+                # Import here to avoid circular dependency
+                import main
+                self.oai_client = main.get_oai_client()
+            except Exception as e:
+                print(f"Warning: Cannot load OpenAI client for repair: {e}")
+                return False
+        return True
+    
+    def _find_relevant_code(self, logs):
+        """
+        Locate the code relevant to some logs, reusing the answer for logs seen before.
+        
+        Args:
+            logs: Recent logs from the process
+            
+        Returns:
+            dict: The parsed find_relevant_code result
+        """
+        key = _relevance_key(logs)
+        relevance_data = self._relevance_cache.get(key)
+        if relevance_data is not None:
+            self._relevance_cache.move_to_end(key)
+            return relevance_data
+        
+        relevance_data = _json_loads(find_relevant_code(logs, self.oai_client, self.config_handler))
+        self._cache_relevance(key, relevance_data)
+        return relevance_data
+    
+    def _cache_relevance(self, key, relevance_data):
+        """Remember a find_relevant_code result, dropping the oldest past RELEVANCE_CACHE_SIZE"""
+        self._relevance_cache[key] = relevance_data
+        self._relevance_cache.move_to_end(key)
+        if len(self._relevance_cache) > RELEVANCE_CACHE_SIZE:
+            self._relevance_cache.popitem(last=False)
+    
+    def _repair_due(self):
+        """
+        Check whether an error should start a repair, and if so start the cooldown.
+        
+        Errors within the cooldown of the last repair only stay in the buffer.
+        Those that arrive within REPAIR_SETTLE_SECONDS of the repair's error
+        are part of the logs it is given.
+        
+        Returns:
+            bool: True if no repair has started within the cooldown
+        """
+        now = time.monotonic()
+        if self._last_repair_ts is not None and now - self._last_repair_ts < self._repair_cooldown:
+            return False
+        self._last_repair_ts = now
+        return True
+    
     def get_logs(self, stream_type=None, lines=None):
         """
         Get the logs from the process buffer.
@@ -163,44 +894,107 @@ class BaseWatcher:
         Returns:
             String containing the last X lines of logs
         """
-        # Get the number of lines from config or use default
+        # Use the line count resolved from config at construction
         if lines is None:
-            try:
-                if self.config_handler:
-                    lines = self.config_handler.get_value("lines_of_logs_to_give_llm", self.buffer_size)
-                else:
-                    lines = self.buffer_size
-            except (AttributeError, KeyError):
-                lines = self.buffer_size
+            lines = self._log_lines
         
-        # Return the last X lines from the buffer
+        # Return the last X lines from the buffer, reusing the last result
+        # if nothing has been appended since
         if self.output_buffer:
-            buffer = list(self.output_buffer)
-            return "\n".join(buffer[-lines:])
+            count = lines if lines > 0 else len(self.output_buffer)
+            version = self.output_buffer.version
+            cached = self._logs_cache
+            if cached is not None and cached[0] == version and cached[1] == count:
+                return cached[2]
+            logs = "\n".join(map(_render_entry, self.output_buffer.tail(count)))
+            self._logs_cache = (version, count, logs)
+            return logs
         
         process_id = self.pid if self.is_attached else (self.process.pid if self.process else None)
         return f"No logs available for process: {self.process_target or process_id}"
     
     def monitor_stream(self, stream, stream_type):
         """
-        Monitor a stream for output and errors.
+        Monitor a stream for output and errors, blocking until it closes.
+        
+        Watchers started with start() are read by the shared I/O reactor
+        instead; this is for callers that want to drain a stream themselves.
         
         Args:
-            stream: The stream to monitor (stdout or stderr)
+            stream: The binary stream to monitor (stdout or stderr)
             stream_type: String identifier for the stream ('stdout' or 'stderr')
         """
-        for line in iter(stream.readline, ''):
-            line = line.strip()
-            # Add line to the process buffer
-            self.output_buffer.append(f"[{stream_type}] {line}")
-            
-            # Simple error detection - you could make this more sophisticated
-            if "error" in line.lower() or "exception" in line.lower() or "traceback" in line.lower():
-                process_id = self.pid if self.is_attached else (self.process.pid if self.process else None)
-                print(f"Error detected in {self.process_target or process_id} {stream_type}: {line}")
-                # Get the logs
-                logs = self.get_logs()
-                self.start_repair(line, logs)
+        fd = stream.fileno()
+        while True:
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+            self.feed_output(chunk, stream_type)
+            if not chunk:
+                break
+    
+    def feed_output(self, chunk, stream_type):
+        """
+        Split a chunk of raw output into lines and handle each complete one.
+        
+        Args:
+            chunk: Bytes read from the stream; b'' means the stream closed
+            stream_type: String identifier for the stream ('stdout' or 'stderr')
+        """
+        if not chunk:
+            partial = self._partial_lines.pop(stream_type, None)
+            if partial:
+                # The stream closed, so a held \r can only have ended the line
+                self.handle_output_line(bytes(partial.rstrip(b'\r')), stream_type)
+            return
+        
+        # Anything after the last line break is incomplete until its break arrives
+        partial = self._partial_lines.setdefault(stream_type, bytearray())
+        data = _take_lines(partial, chunk)
+        if data is None:
+            return
+        
+        # Buffer every complete line at once, then scan them all for errors
+        # in a single pass
+        self.output_buffer.extend_block(stream_type, data)
+        for line in _error_lines(data, self._error_keywords, self._error_pattern):
+            self._report_output_error(line, stream_type)
+    
+    def _watch_stream(self, stream, stream_type):
+        """Register a process pipe with the shared I/O reactor"""
+        def on_data(chunk):
+            self.feed_output(chunk, stream_type)
+            if not chunk:
+                stream.close()
+                with self._streams_lock:
+                    self._open_streams -= 1
+                    if self._open_streams == 0:
+                        self._streams_closed.set()
+        
+        _reactor.register(stream, on_data)
+    
+    def handle_output_line(self, raw_line, stream_type):
+        """
+        Buffer a single line of process output and check it for errors.
+        
+        Args:
+            raw_line: The line as bytes, without its trailing newline
+            stream_type: String identifier for the stream ('stdout' or 'stderr')
+        """
+        # Buffer the raw line; it's only decoded and tagged in get_logs
+        self.output_buffer.append((stream_type, raw_line))
+        
+        # Simple error detection - you could make this more sophisticated
+        if self._error_pattern.search(raw_line):
+            self._report_output_error(raw_line, stream_type)
+    
+    def _report_output_error(self, raw_line, stream_type):
+        """Report an error line from the process output and start a repair for it"""
+        line = raw_line.decode('utf-8', errors='replace').strip()
+        process_id = self.pid if self.is_attached else (self.process.pid if self.process else None)
+        print(f"Error detected in {self.process_target or process_id} {stream_type}: {line}")
+        if self._repair_due():
+            # The logs are taken by the repair worker, once the rest of the
+            # error has been written
+            self.start_repair(line)
     
     def attach_to_process(self, pid):
         """
@@ -212,19 +1006,27 @@ class BaseWatcher:
         Returns:
             bool: True if successfully attached, False otherwise
         """
+        # psutil is only needed for attached processes, so it's imported here
+        # rather than by everything that starts a watcher
+        import psutil
         try:
             # Check if process exists
             process = psutil.Process(pid)
             self.pid = pid
             self.is_attached = True
+            self.should_stop = False
+            self._attached_done.clear()
             
-            # Start monitoring thread
-            self.monitor_thread = threading.Thread(
-                target=self.monitor_attached_process,
-                args=(process,)
-            )
-            self.monitor_thread.daemon = True
-            self.monitor_thread.start()
+            # Hand the process to the thread shared by all attached watchers
+            cls = BaseWatcher
+            with cls._monitors_cond:
+                if cls._monitor_thread is None:
+                    cls._monitor_thread = threading.Thread(target=cls._run_attached_monitors, name="watchmin-attached")
+                    cls._monitor_thread.daemon = True
+                    cls._monitor_thread.start()
+                cls._pending_monitors.append((self, self._attached_monitor(process)))
+                cls._monitors_cond.notify()
+            self._register()
             
             print(f"Attached to process: {pid} ({process.name()})")
             return True
@@ -236,165 +1038,247 @@ class BaseWatcher:
             print(f"Error attaching to process: {e}")
             return False
     
+    @staticmethod
+    def _run_attached_monitors():
+        """
+        Monitor loop shared by every attached watcher.
+        
+        Each watcher's monitor is a generator that does one round of checks
+        per step and yields the seconds until its next round, so one thread
+        can step them all instead of each sleeping in a thread of its own.
+        """
+        cls = BaseWatcher
+        # [next due time, watcher, monitor generator]
+        monitors = []
+        while True:
+            with cls._monitors_cond:
+                if not cls._pending_monitors:
+                    next_due = min((monitor[0] for monitor in monitors), default=None)
+                    cls._monitors_cond.wait(None if next_due is None else max(next_due - time.monotonic(), 0))
+                monitors.extend([0, watcher, steps] for watcher, steps in cls._pending_monitors)
+                cls._pending_monitors.clear()
+            
+            now = time.monotonic()
+            for monitor in list(monitors):
+                if monitor[0] > now:
+                    continue
+                try:
+                    monitor[0] = now + next(monitor[2])
+                except StopIteration:
+                    monitors.remove(monitor)
+                except Exception as e:
+                    print(f"Error monitoring attached process: {e}")
+                    monitors.remove(monitor)
+                    monitor[2].close()
+    
     def monitor_attached_process(self, process):
-        """Monitor a process that was attached to rather than started by us"""
+        """
+        Monitor a process that was attached to rather than started by us.
+        
+        Blocks until the process exits or monitoring is stopped. Watchers
+        attached with attach_to_process are monitored by a shared thread instead.
+        """
         self.should_stop = False
+        for delay in self._attached_monitor(process):
+            time.sleep(delay)
+    
+    def _attached_monitor(self, process):
+        """
+        Generator that monitors an attached process one round at a time.
+        
+        Yields:
+            float: Seconds to wait before the next round
+        """
+        try:
+            yield from self._attached_rounds(process)
+        finally:
+            self.is_attached = False
+            self._attached_done.set()
+    
+    def _attached_rounds(self, process):
+        """The rounds of checks behind _attached_monitor"""
+        import psutil
         
         # Add initial process info to buffer
         try:
-            cmd = process.cmdline()
-            self.output_buffer.append(f"[attached] Monitoring process: {process.pid} ({process.name()})")
-            self.output_buffer.append(f"[attached] Command: {' '.join(cmd)}")
+            with process.oneshot():
+                cmd = process.cmdline()
+                name = process.name()
+            self.output_buffer.append(("attached", f"Monitoring process: {process.pid} ({name})"))
+            self.output_buffer.append(("attached", f"Command: {' '.join(cmd)}"))
         except (psutil.NoSuchProcess, psutil.AccessDenied):
-            self.output_buffer.append(f"[attached] Process {process.pid} no longer exists or access denied")
-            self.is_attached = False
+            self.output_buffer.append(("attached", f"Process {process.pid} no longer exists or access denied"))
             return
             
         # Check if we can find log files for this process
         log_files = self.find_process_log_files(process)
-        log_file_watchers = []
+        log_tails = []
         
         # Set up log file watching if any were found
         for log_file in log_files:
-            thread = threading.Thread(
-                target=self.monitor_log_file,
-                args=(log_file,)
-            )
-            thread.daemon = True
-            thread.start()
-            log_file_watchers.append(thread)
+            tail = self.monitor_log_file(log_file)
+            if tail is not None:
+                log_tails.append(tail)
         
         # Monitor process status and resource usage
         while not self.should_stop:
             try:
-                if not process.is_running():
+                # Read every metric from one pass over /proc/<pid>; cpu_percent
+                # without an interval is the delta since the previous loop
+                try:
+                    info = process.as_dict(attrs=['status', 'cpu_percent', 'memory_info'], ad_value=None)
+                except psutil.NoSuchProcess:
+                    info = None
+                
+                if info is None:
                     # Check exit status for errors
                     try:
                         exit_code = process.wait()  # Get the exit code
-                        self.output_buffer.append(f"[attached] Process {process.pid} has terminated with exit code {exit_code}")
+                        self.output_buffer.append(("attached", f"Process {process.pid} has terminated with exit code {exit_code}"))
                         
                         # If process exited with non-zero status, treat as potential error
                         if exit_code != 0:
                             error_message = f"Process terminated with exit code {exit_code}"
-                            self.output_buffer.append(f"[attached] Error detected: {error_message}")
+                            self.output_buffer.append(("attached", f"Error detected: {error_message}"))
                             print(f"Error detected in attached process {process.pid}: {error_message}")
-                            logs = self.get_logs()
-                            self.start_repair(error_message, logs)
+                            if self._repair_due():
+                                logs = self.get_logs()
+                                self.start_repair(error_message, logs)
                     except (psutil.NoSuchProcess, psutil.TimeoutExpired):
-                        self.output_buffer.append(f"[attached] Process {process.pid} has terminated")
+                        self.output_buffer.append(("attached", f"Process {process.pid} has terminated"))
                     break
                     
-                # Check recent output buffer entries for errors
-                if len(self.output_buffer) > 0:
-                    # Check last few entries for errors
-                    recent_entries = list(self.output_buffer)[-5:]  # Check last 5 entries
-                    for entry in recent_entries:
-                        if ("error" in entry.lower() or "exception" in entry.lower() or 
-                            "traceback" in entry.lower()) and "[attached]" not in entry.lower():
-                            # Make sure we haven't already processed this error
-                            if not hasattr(self, '_last_error_entry') or self._last_error_entry != entry:
-                                self._last_error_entry = entry
-                                print(f"Error detected in attached process {process.pid}: {entry}")
-                                logs = self.get_logs()
-                                self.start_repair(entry, logs)
+                # Repair errors the log-file tailer has found since the last check
+                while True:
+                    try:
+                        entry = self._error_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    print(f"Error detected in attached process {process.pid}: {entry}")
+                    if self._repair_due():
+                        logs = self.get_logs()
+                        self.start_repair(entry, logs)
                     
                 # Collect process metrics
-                try:
-                    cpu_percent = process.cpu_percent(interval=0.1)
-                    memory_info = process.memory_info()
-                    
-                    # Only add to buffer if values are significant
-                    if cpu_percent > 80:  # High CPU usage
-                        self.output_buffer.append(f"[attached] High CPU: {cpu_percent}% for {process.pid}")
-                    
-                    # Check for potential memory leaks (only log significant increases)
+                cpu_percent = info['cpu_percent']
+                memory_info = info['memory_info']
+                
+                # Only add to buffer if values are significant
+                if cpu_percent is not None and cpu_percent > 80:  # High CPU usage
+                    self.output_buffer.append(("attached", f"High CPU: {cpu_percent}% for {process.pid}"))
+                
+                # Check for potential memory leaks (only log significant increases)
+                if memory_info is not None:
                     if hasattr(self, 'last_memory_usage'):
                         memory_increase = memory_info.rss - self.last_memory_usage
                         # Log if memory increased by more than 10MB
                         if memory_increase > 10 * 1024 * 1024:  
-                            self.output_buffer.append(f"[attached] Memory increased by {memory_increase/1024/1024:.2f} MB")
+                            self.output_buffer.append(("attached", f"Memory increased by {memory_increase/1024/1024:.2f} MB"))
                     
                     self.last_memory_usage = memory_info.rss
-                    
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
                 
                 # Check for process exceptions or crashes
-                try:
-                    status = process.status()
-                    if status == psutil.STATUS_ZOMBIE:
-                        self.output_buffer.append(f"[attached] Process {process.pid} is in zombie state")
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
+                if info['status'] == psutil.STATUS_ZOMBIE:
+                    self.output_buffer.append(("attached", f"Process {process.pid} is in zombie state"))
                     
-                time.sleep(1)
+                delay = 1
                 
             except psutil.NoSuchProcess:
-                self.output_buffer.append(f"[attached] Process {process.pid} has terminated")
+                self.output_buffer.append(("attached", f"Process {process.pid} has terminated"))
                 break
             except Exception as e:
-                self.output_buffer.append(f"[attached] Error monitoring process: {e}")
-                time.sleep(5)  # Back off on errors
+                self.output_buffer.append(("attached", f"Error monitoring process: {e}"))
+                delay = 5  # Back off on errors
+            yield delay
         
-        # Wait for log file watchers to finish
-        for thread in log_file_watchers:
-            thread.join(timeout=1)
-            
-        self.is_attached = False
+        # Stop tailing this process's log files
+        for tail in log_tails:
+            _reactor.remove_tail(tail)
     
     def find_process_log_files(self, process):
-        """Find log files that might be associated with the process"""
+        """
+        Find log files that might be associated with the process.
+        
+        Only files the process has open are considered. On Linux they are read
+        straight from /proc/<pid>/fd, so the cost is bounded by the number of
+        open descriptors rather than the size of the working directory tree.
+        At most MAX_LOG_FILES are returned.
+        """
+        import psutil
         log_files = []
+        seen = set()
+        fd_dir = f"/proc/{process.pid}/fd"
         
         try:
-            # Check open files
-            for open_file in process.open_files():
-                if '.log' in open_file.path.lower() or 'log' in open_file.path.lower():
-                    log_files.append(open_file.path)
-            
-            # Check process working directory for log files
-            try:
-                proc_cwd = process.cwd()
-                for root, _, files in os.walk(proc_cwd):
-                    for file in files:
-                        if '.log' in file.lower():
-                            log_files.append(os.path.join(root, file))
-            except (psutil.AccessDenied, PermissionError):
-                pass
+            if os.path.isdir(fd_dir):
+                for entry in os.scandir(fd_dir):
+                    try:
+                        path = os.readlink(entry.path)
+                    except OSError:
+                        continue
+                    # Pipes, sockets and anonymous inodes aren't absolute paths
+                    if (path.startswith('/') and path not in seen and _is_log_path(path)
+                            and os.path.isfile(path)):
+                        seen.add(path)
+                        log_files.append(path)
+                        if len(log_files) >= MAX_LOG_FILES:
+                            break
+            else:
+                # Check open files
+                for open_file in process.open_files():
+                    if open_file.path not in seen and _is_log_path(open_file.path):
+                        seen.add(open_file.path)
+                        log_files.append(open_file.path)
+                        if len(log_files) >= MAX_LOG_FILES:
+                            break
                 
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
+        except (psutil.NoSuchProcess, psutil.AccessDenied, OSError):
             pass
             
         return log_files
     
     def monitor_log_file(self, log_file):
-        """Monitor a log file for changes and errors"""
+        """
+        Monitor a log file for changes and errors.
+        
+        The file is tailed from its current end by the shared I/O reactor, so
+        this returns as soon as the file is registered. If the file is rotated
+        the reactor carries on with the new file at the same path.
+        
+        Returns:
+            The reactor's handle for the tail, to pass to _reactor.remove_tail,
+            or None if the file couldn't be opened
+        """
         try:
-            # Get current file size
-            file_size = os.path.getsize(log_file)
+            fd = os.open(log_file, os.O_RDONLY)
+            # Start from the current end of the file
+            file_size = os.fstat(fd).st_size
             
-            self.output_buffer.append(f"[log] Monitoring log file: {log_file}")
+            self.output_buffer.append(("log", f"Monitoring log file: {log_file}"))
             
-            with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                # Move to the end of file
-                f.seek(file_size)
-                
-                while not self.should_stop:
-                    line = f.readline()
-                    if line:
-                        line = line.strip()
-                        self.output_buffer.append(f"[log] {line}")
-                        
-                        # Check for errors
-                        if "error" in line.lower() or "exception" in line.lower():
-                            print(f"Error detected in log file {log_file}: {line}")
-                            logs = self.get_logs()
-                            self.start_repair(line, logs)
-                    else:
-                        # No new data, sleep briefly
-                        time.sleep(0.1)
+            partial = bytearray()
+            def on_data(chunk):
+                data = _take_lines(partial, chunk)
+                if data is not None:
+                    self.output_buffer.extend_block("log", data)
+                    for line in _error_lines(data, self._error_keywords, self._error_pattern):
+                        self._queue_log_error(line, log_file)
+            
+            return _reactor.add_tail(fd, file_size, on_data, log_file)
         except Exception as e:
-            self.output_buffer.append(f"[log] Error monitoring log file {log_file}: {e}")
+            self.output_buffer.append(("log", f"Error monitoring log file {log_file}: {e}"))
+            return None
+    
+    def _queue_log_error(self, raw_line, log_file):
+        """
+        Report an error line from a log file.
+        
+        Errors are queued for the attached-process monitor rather than repaired
+        on the reactor thread, which would stall every other watcher.
+        """
+        line = raw_line.decode('utf-8', errors='ignore').strip()
+        print(f"Error detected in log file {log_file}: {line}")
+        self._error_queue.put(line)
     
     def start(self):
         """Start watching the process"""
@@ -408,32 +1292,17 @@ class BaseWatcher:
             
         try:
             # Start the process and capture its output
-            self.process = subprocess.Popen(
-                self.process_target,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
+            self.process = self._spawn()
             
             print(f"Watching process: {self.process_target} (PID: {self.process.pid})")
+            self._register()
             
-            # Set up threads to monitor stdout and stderr
-            self.stdout_thread = threading.Thread(
-                target=self.monitor_stream,
-                args=(self.process.stdout, "stdout")
-            )
-            self.stdout_thread.daemon = True
-            self.stdout_thread.start()
-            
-            self.stderr_thread = threading.Thread(
-                target=self.monitor_stream,
-                args=(self.process.stderr, "stderr")
-            )
-            self.stderr_thread.daemon = True
-            self.stderr_thread.start()
+            # Hand stdout and stderr to the shared I/O reactor
+            with self._streams_lock:
+                self._open_streams = 2
+                self._streams_closed.clear()
+            self._watch_stream(self.process.stdout, "stdout")
+            self._watch_stream(self.process.stderr, "stderr")
             
             return self.process.pid
             
@@ -441,19 +1310,55 @@ class BaseWatcher:
             print(f"Error watching process: {e}")
             return None
     
+    def _spawn(self):
+        """
+        Start the target process with its stdout and stderr piped back.
+        
+        Commands without shell syntax are exec'd straight from their argv,
+        skipping the intermediate /bin/sh; anything else, and any command
+        that isn't an executable on PATH (a shell builtin, say), runs
+        through the shell as before.
+        
+        Returns:
+            subprocess.Popen: The started process
+        """
+        if self._argv:
+            try:
+                return subprocess.Popen(
+                    self._argv,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    bufsize=READ_CHUNK_SIZE
+                )
+            except (FileNotFoundError, PermissionError):
+                pass
+        return subprocess.Popen(
+            self.process_target,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=READ_CHUNK_SIZE
+        )
+    
+    def _register(self):
+        """Make this watcher reachable through the legacy get_logs function"""
+        with _registry_lock:
+            _watcher_registry[self.process_target or str(self.pid)] = self
+    
     def wait(self):
         """Wait for the watched process and monitoring threads to complete"""
         if self.process:
             # Wait for the process to complete
             self.process.wait()
-            # Wait for monitoring threads to finish
-            if self.stdout_thread:
-                self.stdout_thread.join()
-            if self.stderr_thread:
-                self.stderr_thread.join()
-        elif self.is_attached and self.monitor_thread:
+            # Wait for the reactor to drain both output pipes
+            self._streams_closed.wait()
+        elif self.is_attached:
             # Wait for attached process monitoring to complete
-            self.monitor_thread.join()
+            self._attached_done.wait()
+        
+        # Wait for any repairs the process's errors started
+        with self._repairs_done:
+            self._repairs_done.wait_for(lambda: self._pending_repairs == 0)
     
     def stop(self):
         """Stop the watched process or monitoring"""
@@ -484,7 +1389,16 @@ def establish_watcher(process_target, buffer_size=None):
 
 # Legacy function to maintain backward compatibility
 def get_logs(process_name, lines=None):
-    """Legacy function - this will only work with the last watcher created"""
-    print("Warning: Using legacy get_logs function. Please use BaseWatcher instances directly.")
-    # This is just a placeholder and won't work well with multiple watchers
-    return f"Legacy get_logs function called for {process_name}. Please use BaseWatcher instances directly."
\ No newline at end of file
+    """
+    Legacy function - get the logs of the running watcher for a process.
+    
+    Args:
+        process_name: The process target the watcher was started with, or the
+            PID it attached to
+        lines: Number of log lines to return
+    """
+    with _registry_lock:
+        watcher = _watcher_registry.get(str(process_name))
+    if watcher is None:
+        return f"No logs available for process: {process_name}"
+    return watcher.get_logs(lines=lines)
\ No newline at end of file
@@ -1,7 +1,71 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
+try:
+    # orjson parses and serializes several times faster; the standard
+    # library is the fallback
+    import orjson
+    _json_loads = orjson.loads
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
 import apihandlers.OAIFunctionAssembler as OAIFunctionAssembler
 from watchers.fixers.tools_handler import ToolsHandler
 
+def _tool_content(result):
+    """Serialize a tool result for the conversation, as JSON when it can be"""
+    if isinstance(result, dict):
+        try:
+            return _json_dumps(result)
+        except (TypeError, ValueError):
+            pass
+    return str(result)
+
+# The tool definitions never change, so they're built once for every turn
+_FIXER_TOOLS = OAIFunctionAssembler.get_fixer_tools()
+
+# Tools that only gather information; a response using nothing else is
+# answered within the same turn, at most READONLY_ROUNDS extra times
+_READONLY_TOOLS = frozenset(("read_file", "run_shell_command"))
+READONLY_ROUNDS = 3
+# Tools that can run at the same time as each other. Shell commands are left
+# out: they often change things (pip install, sed -i) in an order the model
+# expects to be kept
+_CONCURRENT_TOOLS = frozenset(("read_file",))
+# Concurrent calls in the same response run on this many threads
+TOOL_WORKERS = 4
+
+# Only the last TRANSCRIPT_TURNS tool calls or replies are sent in full;
+# older ones are condensed into a single note
+TRANSCRIPT_TURNS = 4
+SUMMARY_CHARS = 200
+_SUMMARY_PREFIX = "Prior attempts summary:\n"
+
+def _summarize(messages):
+    """
+    Condense transcript messages into one line each, without an LLM call.
+    
+    Args:
+        messages (list): The messages to condense, possibly starting with an earlier summary
+        
+    Returns:
+        str: The tools called and a clipped copy of what came back
+    """
+    lines = []
+    for message in messages:
+        if message.get("tool_calls"):
+            function = message["tool_calls"][0]["function"]
+            lines.append(f"Called {function['name']}({function['arguments'][:SUMMARY_CHARS]})")
+        elif message["role"] == "tool":
+            lines.append(f"Result: {message['content'][:SUMMARY_CHARS]}")
+        elif message["role"] == "developer":
+            # The summary from an earlier trim
+            lines.append(message["content"][len(_SUMMARY_PREFIX):])
+        elif message.get("content"):
+            lines.append(f"{message['role'].capitalize()}: {message['content'][:SUMMARY_CHARS]}")
+    return "\n".join(lines)
+
 class BaseFixer:
     def __init__(self, process_target, pid, config_handler=None, oai_client=None):
         self.process_target = process_target
@@ -9,6 +73,46 @@ class BaseFixer:
         self.isfixed = False
         self.config_handler = config_handler
         self.oai_client = oai_client
+        # Config values used on every turn, read once
+        if config_handler:
+            self._model = config_handler.get_value("model_for_fixer")
+            self._system_prompt = config_handler.get_value("fixer_prompt")
+        else:
+            self._model = None
+            self._system_prompt = None
+        # One tools handler serves every tool call, dispatched by name
+        self._tools = ToolsHandler()
+        # Threads are only started once a response has several read-only calls
+        self._tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="watchmin-tool")
+        self._dispatch = {
+            "run_shell_command": lambda args: self._tools.run_shell_command(args.get("command"), args.get("timeout")),
+            "run_python_code": lambda args: self._tools.run_python_code(args.get("code"), args.get("timeout")),
+            "mark_as_fixed": self._mark_as_fixed,
+            "read_file": lambda args: self._tools.read_file(
+                args.get("file_path"),
+                args.get("line_start"),
+                args.get("line_end")
+            ),
+            "edit_file": lambda args: self._tools.edit_file(
+                args.get("file_path"),
+                args.get("line_start"),
+                args.get("line_end"),
+                args.get("new_content")
+            ),
+        }
+
+    def reset(self, pid=None):
+        """
+        Forget the current conversation so the fixer can take on a new error.
+        
+        Args:
+            pid: Optional; the process ID to fix from now on
+        """
+        if pid is not None:
+            self.pid = pid
+        self.isfixed = False
+        if hasattr(self, 'messages'):
+            del self.messages
 
     def fix(self, error, logs, relevant_code):
         """
@@ -16,7 +120,9 @@ class BaseFixer:
         
         This method handles one interaction/turn with the LLM. It sends the error, logs,
         and relevant code to the LLM, gets a response, processes any tool calls,
-        and updates the conversation context.
+        and updates the conversation context. If the response only reads files or
+        runs shell commands, their results are sent back within the same turn, up
+        to READONLY_ROUNDS more times.
         
         Args:
             error: The error message
@@ -34,71 +140,125 @@ class BaseFixer:
         # If this is the first call to fix, initialize messages
         if not hasattr(self, 'messages'):
             self.messages = [
-                {"role": "developer", "content": self.config_handler.get_value("fixer_prompt")},
+                {"role": "developer", "content": self._system_prompt},
                 {"role": "user", "content": f"Error: {error}\nLogs: {logs}\nRelevant Code: {relevant_code}"}
             ]
         
-        # Make an API call for this turn
-        response = self.oai_client.chat.completions.create(
-            model=self.config_handler.get_value("model_for_fixer"),
-            messages=self.messages,
-            tools=OAIFunctionAssembler.get_fixer_tools(),
-        )
+        # Results of informational tool calls go straight back to the model
+        # instead of costing a whole turn of the repair loop
+        for _ in range(READONLY_ROUNDS + 1):
+            self._trim_transcript()
+            
+            # Make an API call for this turn
+            response = self.oai_client.chat.completions.create(
+                model=self._model,
+                messages=self.messages,
+                tools=_FIXER_TOOLS,
+            )
         
-        # Process the response
-        message = response.choices[0].message
-        print(f"Response from model: {message.content}")
+            # Process the response
+            message = response.choices[0].message
+            print(f"Response from model: {message.content}")
         
-        # Check if the model wants to use a tool
-        if hasattr(message, 'tool_calls') and message.tool_calls:
-            for tool_call in message.tool_calls:
-                # Get tool details
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
+            # Check if the model wants to use a tool
+            if hasattr(message, 'tool_calls') and message.tool_calls:
+                # Execute the tools, then record each call and its result in order
+                results = self._run_tool_calls(message.tool_calls)
+                for tool_call, (function_args, tool_result) in zip(message.tool_calls, results):
+                    function_name = tool_call.function.name
                 
-                # Execute the appropriate tool
-                tool_result = self._execute_tool(function_name, function_args)
+                    # Add the tool call and result to messages
+                    self.messages.append({
+                        "role": "assistant",
+                        "tool_calls": [
+                            {
+                                "id": tool_call.id,
+                                "type": "function",
+                                "function": {
+                                    "name": function_name,
+                                    "arguments": tool_call.function.arguments
+                                }
+                            }
+                        ]
+                    })
+                
+                    self.messages.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call.id,
+                        "content": _tool_content(tool_result)
+                    })
                 
-                # Add the tool call and result to messages
+                    # If the model marked the issue as fixed, set flag
+                    if function_name == "mark_as_fixed" and function_args.get("fixed", False):
+                        self.isfixed = True
+                
+                # Anything beyond gathering information ends the turn
+                if self.isfixed or any(tool_call.function.name not in _READONLY_TOOLS for tool_call in message.tool_calls):
+                    break
+            else:
+                # If no tool calls, add the response to messages for context
                 self.messages.append({
                     "role": "assistant",
-                    "tool_calls": [
-                        {
-                            "id": tool_call.id,
-                            "type": "function",
-                            "function": {
-                                "name": function_name,
-                                "arguments": tool_call.function.arguments
-                            }
-                        }
-                    ]
+                    "content": message.content
                 })
-                
+            
+                # Ask if the error is fixed
                 self.messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": str(tool_result)
+                    "role": "user",
+                    "content": "Is the error fixed or should we continue trying to fix it? Use the mark_as_fixed tool to indicate if the error is fixed."
                 })
-                
-                # If the model marked the issue as fixed, set flag
-                if function_name == "mark_as_fixed" and function_args.get("fixed", False):
-                    self.isfixed = True
-        else:
-            # If no tool calls, add the response to messages for context
-            self.messages.append({
-                "role": "assistant",
-                "content": message.content
-            })
-            
-            # Ask if the error is fixed
-            self.messages.append({
-                "role": "user",
-                "content": "Is the error fixed or should we continue trying to fix it? Use the mark_as_fixed tool to indicate if the error is fixed."
-            })
+                break
         
         # Return current fixed status
         return self.isfixed
     
+    def _run_tool_calls(self, tool_calls):
+        """
+        Execute the tool calls from one response, overlapping the file reads.
+        
+        Consecutive read_file calls run together on the tool pool. Any other
+        call waits for the calls before it and runs alone, so shell commands,
+        edits and mark_as_fixed still happen in the order the model gave them.
+        
+        Args:
+            tool_calls (list): The tool calls from the model's response
+            
+        Returns:
+            list: The parsed arguments and result of each call, in order
+        """
+        results = []
+        batch = []
+        def drain():
+            results.extend((args, future.result()) for args, future in batch)
+            batch.clear()
+        
+        for tool_call in tool_calls:
+            function_name = tool_call.function.name
+            function_args = _json_loads(tool_call.function.arguments)
+            if len(tool_calls) > 1 and function_name in _CONCURRENT_TOOLS:
+                batch.append((function_args, self._tool_pool.submit(self._execute_tool, function_name, function_args)))
+            else:
+                drain()
+                results.append((function_args, self._execute_tool(function_name, function_args)))
+        drain()
+        return results
+    
+    def _trim_transcript(self):
+        """
+        Keep the request size bounded as the conversation grows.
+        
+        The system prompt, the original error and the last TRANSCRIPT_TURNS
+        exchanges are kept; everything in between becomes one summary note.
+        Every exchange is an assistant message and the tool result or user
+        reply after it, so the kept tail never splits a tool call from its result.
+        """
+        keep = 2 * TRANSCRIPT_TURNS
+        # Nothing to do while only an earlier summary precedes the tail
+        if len(self.messages) <= 3 + keep:
+            return
+        old = self.messages[2:-keep]
+        self.messages[2:-keep] = [{"role": "developer", "content": _SUMMARY_PREFIX + _summarize(old)}]
+    
     def _execute_tool(self, function_name, args):
         """
         Execute the specified tool function with the given arguments.
@@ -110,36 +270,16 @@ class BaseFixer:
         Returns:
             dict: Result of the tool execution
         """
-        tool_handler = ToolsHandler()
-        
-        if function_name == "run_shell_command":
-            return tool_handler.run_shell_command(args.get("command"), args.get("timeout"))
-            
-        elif function_name == "run_python_code":
-            return tool_handler.run_python_code(args.get("code"), args.get("timeout"))
-            
-        elif function_name == "mark_as_fixed":
-            result = tool_handler.mark_as_fixed(args.get("fixed"))
-            self.isfixed = args.get("fixed", False)
-            return result
-            
-        elif function_name == "read_file":
-            return tool_handler.read_file(
-                args.get("file_path"), 
-                args.get("line_start"), 
-                args.get("line_end")
-            )
-            
-        elif function_name == "edit_file":
-            return tool_handler.edit_file(
-                args.get("file_path"),
-                args.get("line_start"),
-                args.get("line_end"),
-                args.get("new_content")
-            )
-            
-        else:
+        tool = self._dispatch.get(function_name)
+        if tool is None:
             return {
                 "success": False,
                 "error": f"Unknown function name: {function_name}"
-            }
\ No newline at end of file
+            }
+        return tool(args)
+    
+    def _mark_as_fixed(self, args):
+        """Run the mark_as_fixed tool and record the outcome on the fixer"""
+        result = self._tools.mark_as_fixed(args.get("fixed"))
+        self.isfixed = args.get("fixed", False)
+        return result
\ No newline at end of file
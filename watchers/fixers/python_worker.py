@@ -0,0 +1,120 @@
+"""
+Warm Python interpreter behind ToolsHandler.run_python_code.
+
+The tools handler starts this script once and keeps it running. Each piece
+of code is run in a child forked from this already-initialised interpreter,
+so a run costs a fork rather than a full interpreter start-up, while every
+run still gets a fresh process of its own.
+
+Protocol over the Unix socket whose descriptor is passed as argv[1], per run:
+    request: 4-byte length and a JSON object {"code", "cwd", "env"}, sent with
+             the write ends of the stdout and stderr pipes attached
+    reply:   4-byte pid of the child running the code, then its 4-byte wait
+             status once it has exited
+"""
+import atexit
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import traceback
+import types
+
+_INT = struct.Struct('!i')
+
+def _recv_exact(sock, size, data=b''):
+    """Receive exactly size bytes, counting any already received in data"""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("tools handler closed the connection")
+        data += chunk
+    return data
+
+def _run_child(request):
+    """
+    Run one request's code the way `python -` would, in the forked child.
+
+    Args:
+        request (dict): The code plus the working directory and environment to run it in
+
+    Returns:
+        int: The exit status for the child
+    """
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    # Imports resolve against the caller's working directory, not this script's
+    sys.path[0] = request["cwd"]
+    sys.argv = ['-']
+
+    # The code gets a __main__ of its own, as under `python -`, so pickle and
+    # multiprocessing find what it defines there rather than in this script
+    main_module = types.ModuleType('__main__')
+    main_module.__file__ = '<stdin>'
+    main_module.__builtins__ = __builtins__
+    main_module.__loader__ = sys.modules['__main__'].__loader__
+    sys.modules['__main__'] = main_module
+    
+    status = 0
+    try:
+        exec(compile(request["code"], '<stdin>', 'exec'), vars(main_module))
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException as e:
+        # Leave this frame out, so the traceback starts at the user's code
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        status = 1
+    # Shut down the way the interpreter would: join non-daemon threads, then
+    # run atexit handlers
+    threading._shutdown()
+    atexit._run_exitfuncs()
+    return status
+
+def main(fd):
+    sock = socket.socket(fileno=fd)
+    while True:
+        try:
+            header, fds, _, _ = socket.recv_fds(sock, _INT.size, 2)
+            if not header:
+                return
+            request = json.loads(_recv_exact(sock, _INT.unpack(_recv_exact(sock, _INT.size, header))[0]))
+        except (OSError, EOFError):
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                sock.close()
+                os.dup2(fds[0], 1)
+                os.dup2(fds[1], 2)
+                for pipe_fd in fds:
+                    os.close(pipe_fd)
+                status = _run_child(request)
+            finally:
+                try:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                finally:
+                    os._exit(status)
+
+        for pipe_fd in fds:
+            os.close(pipe_fd)
+        try:
+            sock.sendall(_INT.pack(pid))
+            _, status = os.waitpid(pid, 0)
+            sock.sendall(_INT.pack(status))
+        except OSError:
+            return
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]))
@@ -1,40 +1,481 @@
+import atexit
+import errno
+import json
+import locale
+import mmap
 import os
+import re
+import selectors
+import shlex
+import signal
+import socket
+import stat
+import struct
 import subprocess
 import sys
+import tempfile
 import threading
 import time
+from collections import OrderedDict
+
+# LRU cache of line-start byte offsets per file, keyed by path and validated
+# against (st_mtime_ns, st_size) so edits made elsewhere invalidate it
+OFFSET_CACHE_SIZE = 32
+_offset_cache = OrderedDict()
+_offset_cache_lock = threading.Lock()
+_NEWLINE = re.compile(b'\n')
+# Lines of new content for edit_file, ending at \n only
+_LINE = re.compile(b'[^\n]*\n|[^\n]+')
+
+def _line_offsets(file_path):
+    """
+    Get the byte offset at which every line of a file starts.
+    
+    The returned list has one entry per line followed by a sentinel equal to
+    the file size, so line i spans offsets[i]:offsets[i+1].
+    
+    Args:
+        file_path (str): Path to the file to index
+        
+    Returns:
+        list: Line-start byte offsets plus the end-of-file sentinel
+    """
+    stat = os.stat(file_path)
+    with _offset_cache_lock:
+        cached = _offset_cache.get(file_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            _offset_cache.move_to_end(file_path)
+            return cached[2]
+    
+    offsets = [0]
+    if stat.st_size:
+        with open(file_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Every line after the first starts just past a newline; the
+                # scan and the offset collection both stay in C
+                offsets.extend(map(re.Match.end, _NEWLINE.finditer(mm)))
+    if offsets[-1] != stat.st_size:
+        offsets.append(stat.st_size)
+    
+    _cache_offsets(file_path, stat, offsets)
+    return offsets
+
+def _cache_offsets(file_path, stat, offsets):
+    """Store a file's line offsets, evicting the least recently used file when full"""
+    with _offset_cache_lock:
+        _offset_cache[file_path] = (stat.st_mtime_ns, stat.st_size, offsets)
+        _offset_cache.move_to_end(file_path)
+        while len(_offset_cache) > OFFSET_CACHE_SIZE:
+            _offset_cache.popitem(last=False)
+
+# edit_file copies the unchanged parts of a file with sendfile, which keeps
+# the bytes in the kernel; only Linux supports it between regular files, and
+# elsewhere the copy goes through userspace in blocks of COPY_CHUNK_SIZE
+COPY_CHUNK_SIZE = 131072
+_HAS_SENDFILE = sys.platform.startswith('linux') and hasattr(os, 'sendfile')
+_SENDFILE_MAX = 1 << 30
+# Each thread reuses one copy buffer instead of allocating a block per read
+_copy_buffers = threading.local()
+
+def _copy_buffer():
+    """Get this thread's COPY_CHUNK_SIZE buffer for userspace copies"""
+    buf = getattr(_copy_buffers, 'buf', None)
+    if buf is None:
+        buf = _copy_buffers.buf = memoryview(bytearray(COPY_CHUNK_SIZE))
+    return buf
+
+def _copy_range(src, dst, offset, count=None):
+    """
+    Append a byte range of one file to another.
+    
+    Args:
+        src (file): Binary file to copy from
+        dst (file): Binary file to append to
+        offset (int): Byte offset in src to start copying at
+        count (int): Number of bytes to copy, None to copy to the end of src
+    """
+    remaining = _SENDFILE_MAX if count is None else count
+    if _HAS_SENDFILE:
+        # sendfile writes straight to the descriptor, behind dst's buffer
+        dst.flush()
+        try:
+            while remaining > 0:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, min(remaining, _SENDFILE_MAX))
+                if not sent:
+                    return
+                offset += sent
+                if count is not None:
+                    remaining -= sent
+            return
+        except OSError as e:
+            # Some filesystems cannot sendfile; copy what is left the slow way
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+    
+    buf = _copy_buffer()
+    src.seek(offset)
+    while remaining > 0:
+        size = src.readinto(buf[:min(COPY_CHUNK_SIZE, remaining)])
+        if not size:
+            break
+        dst.write(buf[:size])
+        if count is not None:
+            remaining -= size
+
+# posix_spawn avoids the fork page-table copy and a pidfd lets the timeout be
+# a plain selector wait; both are Linux-only, so other platforms use Popen
+_HAS_PIDFD = hasattr(os, 'posix_spawn') and hasattr(os, 'pidfd_open')
+# Python ignores these, and children would inherit that; Popen resets them
+# (restore_signals), so spawned commands get their defaults back too
+_RESTORED_SIGNALS = tuple(getattr(signal, name) for name in ('SIGPIPE', 'SIGXFZ', 'SIGXFSZ') if hasattr(signal, name))
+
+# Characters that make a command line depend on shell expansion or syntax
+_SHELL_CHARS = frozenset('$`*?[~#!\n')
+
+def _split_command(command):
+    """
+    Split a command line into an argv list if it can run without a shell.
+    
+    Args:
+        command: The command line string
+        
+    Returns:
+        list: The argv, or None if the command uses shell syntax such as
+            pipes, redirects, globs, variables or environment assignments
+    """
+    if _SHELL_CHARS.intersection(command):
+        return None
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        argv = list(lexer)
+    except ValueError:
+        # Unbalanced quotes; let the shell report it
+        return None
+    if not argv or '=' in argv[0]:
+        return None
+    # Operators such as |, && and > come back as tokens of their own
+    if any(token and set(token) <= set(lexer.punctuation_chars) for token in argv):
+        return None
+    return argv
+
+def _command_argv(command, use_shell):
+    """
+    Work out the argv to run a command with.
+    
+    Args:
+        command (str): The shell command to execute
+        use_shell (bool): Always run the command through the shell
+        
+    Returns:
+        list: The command split into arguments, or a `sh -c` argv if it needs a shell
+    """
+    if not use_shell:
+        args = _split_command(command)
+        if args:
+            return args
+    if sys.platform == 'win32':
+        return command
+    return ['/bin/sh', '-c', command]
+
+def _decode_output(data):
+    """Decode captured output the same way a text-mode Popen would."""
+    text = data.decode(locale.getpreferredencoding(False), errors='replace')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+def _spawn_command(args, timeout):
+    """
+    Run a command with posix_spawn, waiting on its pidfd and pipes.
+    
+    Args:
+        args (list): The program to run and its arguments
+        timeout (int): Maximum seconds to wait for completion, None to wait forever
+        
+    Returns:
+        tuple: (returncode, stdout, stderr)
+        
+    Raises:
+        subprocess.TimeoutExpired: If the command did not finish in time
+    """
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    try:
+        pid = os.posix_spawnp(args[0], args, os.environ, file_actions=[
+            (os.POSIX_SPAWN_DUP2, out_w, 1),
+            (os.POSIX_SPAWN_DUP2, err_w, 2),
+        ], setsigdef=_RESTORED_SIGNALS)
+    except Exception:
+        os.close(out_r)
+        os.close(err_r)
+        raise
+    finally:
+        os.close(out_w)
+        os.close(err_w)
+    
+    pidfd = os.pidfd_open(pid)
+    output = {out_r: [], err_r: []}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        with selectors.DefaultSelector() as selector:
+            for fd in (out_r, err_r, pidfd):
+                selector.register(fd, selectors.EVENT_READ)
+            
+            # Keep draining the pipes until they close and the process exits
+            while selector.get_map():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                    raise subprocess.TimeoutExpired(args, timeout)
+                
+                for key, _ in selector.select(remaining):
+                    if key.fd == pidfd:
+                        selector.unregister(pidfd)
+                        continue
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        output[key.fd].append(data)
+                    else:
+                        selector.unregister(key.fd)
+        
+        _, status = os.waitpid(pid, 0)
+        return (
+            os.waitstatus_to_exitcode(status),
+            _decode_output(b''.join(output[out_r])),
+            _decode_output(b''.join(output[err_r]))
+        )
+    finally:
+        for fd in (out_r, err_r, pidfd):
+            os.close(fd)
+
+def _popen_command(args, timeout):
+    """
+    Run a command with subprocess.Popen, for platforms without pidfd.
+    
+    Args:
+        args (list): The program to run and its arguments, or a command string for cmd.exe
+        timeout (int): Maximum seconds to wait for completion
+        
+    Returns:
+        tuple: (returncode, stdout, stderr)
+        
+    Raises:
+        subprocess.TimeoutExpired: If the command did not finish in time
+    """
+    # close_fds=False lets CPython use posix_spawn where it has it
+    process = subprocess.Popen(
+        args,
+        shell=isinstance(args, str),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        close_fds=False
+    )
+    
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise
+    return process.returncode, stdout, stderr
+
+# run_python_code forks each run from a warm interpreter running
+# python_worker.py; that needs fork and descriptor passing, so other
+# platforms start a new interpreter every time
+_HAS_FORK_SERVER = hasattr(os, 'fork') and hasattr(socket, 'send_fds')
+_PYTHON_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+_INT = struct.Struct('!i')
+
+def _recv_exact(sock, size):
+    """Receive exactly size bytes from a socket"""
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("Python worker exited")
+        data += chunk
+    return data
+
+class _WorkerFailed(Exception):
+    """The Python worker failed after it was handed the code, which may have run"""
+
+class _PythonForkServer:
+    """
+    A warm interpreter that forks a fresh child for every piece of code.
+    
+    The worker is started on first use and restarted if it dies. Runs are
+    handed to it one at a time.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process = None
+        self._sock = None
+        atexit.register(self._stop)
+    
+    def _start(self):
+        """Start the worker process and connect to it"""
+        ours, theirs = socket.socketpair()
+        try:
+            self._process = subprocess.Popen(
+                [sys.executable, _PYTHON_WORKER, str(theirs.fileno())],
+                stdin=subprocess.DEVNULL,
+                pass_fds=(theirs.fileno(),)
+            )
+        except Exception:
+            ours.close()
+            raise
+        finally:
+            theirs.close()
+        self._sock = ours
+    
+    def _stop(self):
+        """Shut the worker down, so the next run starts a new one"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+    
+    def run(self, code, timeout):
+        """
+        Run Python code in a child forked from the worker.
+        
+        Args:
+            code (str): Python code to execute
+            timeout (int): Maximum seconds to wait for completion, None to wait forever
+            
+        Returns:
+            tuple: (returncode, stdout, stderr)
+            
+        Raises:
+            subprocess.TimeoutExpired: If the code did not finish in time
+            OSError, EOFError: If the code could not be handed to the worker
+            _WorkerFailed: If the worker failed once it had the code
+        """
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._stop()
+                self._start()
+            try:
+                return self._run(code, timeout)
+            except (OSError, EOFError, _WorkerFailed):
+                self._stop()
+                raise
+    
+    def _run(self, code, timeout):
+        """Send one run to the worker and collect its output and exit status"""
+        request = json.dumps({"code": code, "cwd": os.getcwd(), "env": dict(os.environ)}).encode('utf-8')
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        try:
+            try:
+                socket.send_fds(self._sock, [_INT.pack(len(request))], [out_w, err_w])
+            finally:
+                os.close(out_w)
+                os.close(err_w)
+            self._sock.sendall(request)
+            try:
+                pid, status, output = self._collect(out_r, err_r, timeout)
+            except (OSError, EOFError) as e:
+                raise _WorkerFailed(str(e)) from e
+            return (
+                os.waitstatus_to_exitcode(status),
+                _decode_output(b''.join(output[out_r])),
+                _decode_output(b''.join(output[err_r]))
+            )
+        finally:
+            os.close(out_r)
+            os.close(err_r)
+    
+    def _collect(self, out_r, err_r, timeout):
+        """
+        Wait for a run's output pipes to close and for its exit status.
+        
+        The status is read as soon as the worker sends it, so a child that has
+        exited (leaving something it started holding the pipes) is never killed.
+        
+        Returns:
+            tuple: (pid, wait status, {pipe fd: [output chunks]})
+            
+        Raises:
+            subprocess.TimeoutExpired: If the pipes were still open at the timeout
+        """
+        pid = _INT.unpack(_recv_exact(self._sock, _INT.size))[0]
+        status = None
+        output = {out_r: [], err_r: []}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            for fd in (out_r, err_r, self._sock):
+                selector.register(fd, selectors.EVENT_READ)
+            
+            # The pipes close once the child and anything it started exit
+            while out_r in selector.get_map() or err_r in selector.get_map():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    if status is None:
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            # Exited just now; its status is on the way
+                            pass
+                        _recv_exact(self._sock, _INT.size)
+                    raise subprocess.TimeoutExpired("python", timeout)
+                
+                for key, _ in selector.select(remaining):
+                    if key.fileobj is self._sock:
+                        status = _INT.unpack(_recv_exact(self._sock, _INT.size))[0]
+                        selector.unregister(self._sock)
+                        continue
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        output[key.fd].append(data)
+                    else:
+                        selector.unregister(key.fd)
+        
+        if status is None:
+            status = _INT.unpack(_recv_exact(self._sock, _INT.size))[0]
+        return pid, status, output
+
+_python_fork_server = _PythonForkServer() if _HAS_FORK_SERVER else None
 
 class ToolsHandler:
     @staticmethod
-    def run_shell_command(command, timeout):
+    def run_shell_command(command, timeout, use_shell=False):
         """
         Run a shell command with a timeout.
         
+        Commands without pipes, redirections, globs or other shell syntax are
+        exec'd directly instead of through /bin/sh.
+        
         Args:
             command (str): The shell command to execute
             timeout (int): Maximum seconds to wait for completion
+            use_shell (bool): Always run the command through the shell
             
         Returns:
             dict: Result of the command execution
         """
+        run = _spawn_command if _HAS_PIDFD else _popen_command
         try:
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            stdout, stderr = process.communicate(timeout=timeout)
+            args = _command_argv(command, use_shell)
+            try:
+                returncode, stdout, stderr = run(args, timeout)
+            except (FileNotFoundError, PermissionError):
+                if isinstance(args, str) or args[0] == '/bin/sh':
+                    raise
+                # Let the shell report a missing or non-executable program as usual
+                returncode, stdout, stderr = run(_command_argv(command, True), timeout)
             return {
-                "success": process.returncode == 0,
+                "success": returncode == 0,
                 "stdout": stdout,
                 "stderr": stderr,
-                "returncode": process.returncode
+                "returncode": returncode
             }
         except subprocess.TimeoutExpired:
-            process.kill()
             return {
                 "success": False,
                 "error": f"Command timed out after {timeout} seconds",
@@ -61,51 +502,67 @@ class ToolsHandler:
         Returns:
             dict: Result of the code execution
         """
-        # Create a temporary file to store the code
-        temp_file = "temp_code_execution.py"
+        if _python_fork_server is not None:
+            try:
+                returncode, stdout, stderr = _python_fork_server.run(code, timeout)
+                return {
+                    "stdout": stdout,
+                    "stderr": stderr,
+                    "success": returncode == 0,
+                    "error": None,
+                    "returncode": returncode
+                }
+            except subprocess.TimeoutExpired:
+                return {
+                    "success": False,
+                    "error": f"Code execution timed out after {timeout} seconds",
+                    "stdout": "",
+                    "stderr": ""
+                }
+            except _WorkerFailed as e:
+                # The code may already have run, so it isn't run a second time
+                return {
+                    "success": False,
+                    "error": f"Python worker failed while running the code: {e}",
+                    "stdout": "",
+                    "stderr": ""
+                }
+            except (OSError, EOFError, ValueError):
+                # The code never reached the worker; run it in a fresh interpreter below
+                pass
+        
         try:
-            with open(temp_file, "w") as f:
-                f.write(code)
-            
-            # Create a dictionary to store results from the thread
-            result = {"stdout": "", "stderr": "", "success": False, "error": None}
-            
-            # Define a function to run in a separate thread
-            def run_code():
-                try:
-                    process = subprocess.Popen(
-                        [sys.executable, temp_file],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True
-                    )
-                    stdout, stderr = process.communicate()
-                    result["stdout"] = stdout
-                    result["stderr"] = stderr
-                    result["success"] = process.returncode == 0
-                    result["returncode"] = process.returncode
-                except Exception as e:
-                    result["success"] = False
-                    result["error"] = str(e)
-            
-            # Create and start thread
-            thread = threading.Thread(target=run_code)
-            thread.daemon = True
-            thread.start()
-            
-            # Wait for the thread with timeout
-            thread.join(timeout)
-            
-            # If thread is still alive after timeout, the execution took too long
-            if thread.is_alive():
+            # The code is piped to `python -`, so no temporary file is shared between runs.
+            # close_fds=False lets CPython use posix_spawn instead of fork; our own
+            # descriptors are non-inheritable, so none leak into the child
+            process = subprocess.Popen(
+                [sys.executable, "-"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                close_fds=False
+            )
+            try:
+                stdout, stderr = process.communicate(input=code, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                # Reap the killed process, keeping what it printed before the timeout
+                process.kill()
+                stdout, stderr = process.communicate()
                 return {
                     "success": False,
                     "error": f"Code execution timed out after {timeout} seconds",
-                    "stdout": result.get("stdout", ""),
-                    "stderr": result.get("stderr", "")
+                    "stdout": stdout,
+                    "stderr": stderr
                 }
             
-            return result
+            return {
+                "stdout": stdout,
+                "stderr": stderr,
+                "success": process.returncode == 0,
+                "error": None,
+                "returncode": process.returncode
+            }
             
         except Exception as e:
             return {
@@ -114,13 +571,6 @@ class ToolsHandler:
                 "stdout": "",
                 "stderr": ""
             }
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file):
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
     
     @staticmethod
     def mark_as_fixed(fixed):
@@ -153,34 +603,60 @@ class ToolsHandler:
             dict: File content and status
         """
         try:
-            if not os.path.exists(file_path):
+            # The whole file needs no index: one read and a newline count
+            if line_start <= 0 and line_end == -1:
+                try:
+                    with open(file_path, 'rb') as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    return {
+                        "success": False,
+                        "error": f"File not found: {file_path}"
+                    }
+                total_lines = data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+                return {
+                    "success": True,
+                    "content": data.decode('utf-8').replace('\r\n', '\n'),
+                    "total_lines": total_lines,
+                    "lines_read": total_lines
+                }
+            
+            # Otherwise use the line-offset index so only the requested slice is
+            # decoded; its stat doubles as the existence check
+            try:
+                offsets = _line_offsets(file_path)
+            except FileNotFoundError:
                 return {
                     "success": False,
                     "error": f"File not found: {file_path}"
                 }
-                
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            total_lines = len(offsets) - 1
             
             # Handle special case where line_end is -1
             if line_end == -1:
-                line_end = len(lines) - 1
+                line_end = total_lines - 1
                 
             # Validate line ranges
             if line_start < 0:
                 line_start = 0
-            if line_end >= len(lines):
-                line_end = len(lines) - 1
+            if line_end >= total_lines:
+                line_end = total_lines - 1
                 
-            # Extract requested lines
-            selected_lines = lines[line_start:line_end+1]
-            content = ''.join(selected_lines)
+            # Extract requested lines, with the bounds of lines[line_start:line_end+1]
+            start_idx, end_idx, _ = slice(line_start, line_end + 1).indices(total_lines)
+            lines_read = max(end_idx - start_idx, 0)
+            content = ''
+            if lines_read:
+                with open(file_path, 'rb') as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        content = mm[offsets[start_idx]:offsets[end_idx]].decode('utf-8')
+                content = content.replace('\r\n', '\n')
             
             return {
                 "success": True,
                 "content": content,
-                "total_lines": len(lines),
-                "lines_read": len(selected_lines)
+                "total_lines": total_lines,
+                "lines_read": lines_read
             }
             
         except Exception as e:
@@ -204,46 +680,96 @@ class ToolsHandler:
             dict: Status of the edit operation
         """
         try:
-            if not os.path.exists(file_path):
+            # The edited copy replaces the file a symlink points at, not the link
+            target = os.path.realpath(file_path)
+            
+            # Locate the lines by byte offset instead of reading the whole file
+            try:
+                offsets = _line_offsets(target)
+            except FileNotFoundError:
                 return {
                     "success": False,
                     "error": f"File not found: {file_path}"
                 }
-                
-            # Read the file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            total_lines = len(offsets) - 1
             
             # Handle special case where line_end is -1
             if line_end == -1:
-                line_end = len(lines) - 1
+                line_end = total_lines - 1
                 
             # Validate line ranges
             if line_start < 0:
                 line_start = 0
-            if line_end >= len(lines):
-                line_end = len(lines) - 1
-                
-            # Split new_content into lines, ensuring each line ends with newline
-            new_lines = new_content.split('\n')
-            if new_content.endswith('\n'):
-                new_lines = new_lines[:-1]
+            if line_end >= total_lines:
+                line_end = total_lines - 1
             
-            new_lines_with_newlines = [line + '\n' for line in new_lines[:-1]]
-            if new_lines:
-                if lines and not lines[-1].endswith('\n'):
-                    new_lines_with_newlines.append(new_lines[-1])
-                else:
-                    new_lines_with_newlines.append(new_lines[-1] + '\n')
+            # Same bounds as slicing a list of lines with [:line_start] and [line_end+1:]
+            start_idx = min(line_start, total_lines)
+            end_idx = slice(line_end + 1, None).indices(total_lines)[0]
+            start_off = offsets[start_idx]
+            end_off = offsets[end_idx]
             
-            # Replace lines in the file
-            before = lines[:line_start]
-            after = lines[line_end+1:]
-            updated_lines = before + new_lines_with_newlines + after
+            with open(target, 'rb') as f:
+                # A file without a trailing newline keeps that shape
+                missing_final_newline = False
+                if total_lines:
+                    f.seek(offsets[-1] - 1)
+                    missing_final_newline = f.read(1) != b'\n'
+                
+                # Split new_content into lines that each end with a newline, except
+                # the last one when the file has no final newline. bytes.splitlines
+                # would also break on a lone \r, so content with one uses _LINE
+                new_data = new_content.encode('utf-8')
+                if b'\r' in new_data:
+                    new_lines_with_newlines = _LINE.findall(new_data)
+                else:
+                    new_lines_with_newlines = new_data.splitlines(keepends=True)
+                last_line = new_lines_with_newlines.pop() if new_lines_with_newlines else b''
+                if last_line.endswith(b'\n'):
+                    last_line = last_line[:-1]
+                new_lines_with_newlines.append(last_line if missing_final_newline else last_line + b'\n')
+                new_bytes = b''.join(new_lines_with_newlines)
+                
+                # Stream the unchanged bytes around the edit into a sibling file
+                # and swap it in atomically, so the file is never held in memory
+                # and is never seen half-written
+                tmp_fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(target),
+                    prefix=os.path.basename(target) + '.',
+                    suffix='.tmp'
+                )
+                try:
+                    with os.fdopen(tmp_fd, 'wb') as out:
+                        _copy_range(f, out, 0, start_off)
+                        out.write(new_bytes)
+                        _copy_range(f, out, end_off)
+                        # Make the new content durable before the rename, or a crash
+                        # could leave the file empty instead of old or new
+                        out.flush()
+                        os.fsync(out.fileno())
+                    os.chmod(tmp_path, stat.S_IMODE(os.fstat(f.fileno()).st_mode))
+                    os.replace(tmp_path, target)
+                except BaseException:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+                    raise
             
-            # Write back to the file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.writelines(updated_lines)
+            # Update the cached index rather than rescanning on the next edit
+            if not missing_final_newline or (end_off == offsets[-1] and start_off < offsets[-1]):
+                new_offsets = offsets[:start_idx]
+                pos = start_off
+                for line in new_lines_with_newlines:
+                    if line:
+                        new_offsets.append(pos)
+                        pos += len(line)
+                shift = pos - end_off
+                new_offsets.extend(off + shift for off in offsets[end_idx:])
+                _cache_offsets(target, os.stat(target), new_offsets)
+            else:
+                with _offset_cache_lock:
+                    _offset_cache.pop(target, None)
             
             return {
                 "success": True,
@@ -1,4 +1,211 @@
-from openai import OpenAI
+import json
+import re
+
+# Logs longer than this are compacted before they're sent to the model
+MAX_LOG_CHARS = 32000
+# Traceback frames kept from the part of the logs that is cut, and the
+# characters kept on either side of each
+MAX_FRAMES = 50
+FRAME_CONTEXT = 250
+_FRAME_PATTERN = re.compile(r'File "([^"]+)", line (\d+)')
+
+def _compact_logs(logs, limit=MAX_LOG_CHARS):
+    """
+    Shrink logs to what the model needs to locate the code.
+    
+    The last limit characters of the logs are kept whole. Before them, only
+    the traceback frames (and a little context around each) are kept, since
+    they are what points at a file and line.
+    
+    Args:
+        logs (str): The logs to send
+        limit (int): Characters of the end of the logs to keep whole
+        
+    Returns:
+        str: The logs, or a compacted version when they exceed limit
+    """
+    if len(logs) <= limit:
+        return logs
+    
+    cut = len(logs) - limit
+    frames = [match for match in _FRAME_PATTERN.finditer(logs, 0, cut)][-MAX_FRAMES:]
+    excerpts = []
+    excerpt_end = 0
+    for match in frames:
+        start = max(match.start() - FRAME_CONTEXT, excerpt_end)
+        end = min(match.end() + FRAME_CONTEXT, cut)
+        if excerpts and start == excerpt_end:
+            # Overlapping windows become one excerpt
+            excerpts[-1] += logs[start:end]
+        else:
+            excerpts.append(logs[start:end])
+        excerpt_end = end
+    excerpts.append(logs[cut:])
+    return "\n...\n".join(excerpts)
+
+_SYSTEM_PROMPT = "Given an error message and logs, identify the location of any relevant custom code.\n\nFocus on pinpointing relevant parts of custom code, excluding the interpreter's code, and specify the relevant file and its lines.\n\n# Steps\n\n1. **Analyze the Error Message**: Break down the error message to understand what went wrong.\n2. **Review the Logs**: Look through the logs to gather additional context that can help locate the problem.\n3. **Identify Custom Code**: Distinguish between custom code and interpreter code to focus on user-introduced sections.\n4. **Locate the File and Lines**: Determine the file path and specific line numbers where the issue is likely to originate.\n5. **Determine Relevance**: Assess whether a relevant file and lines can be identified post-analysis.\n\n# Notes\n\n- Ensure that the focus remains on custom code, excluding interpreter-level code."
+
+# The fields of one answer, shared by the single and batched schemas
+_RELEVANCE_PROPERTIES = {
+    "file_path": {
+        "type": "string",
+        "description": "The full Linux file path to where the relevant file is."
+    },
+    "start_line": {
+        "type": "number",
+        "description": "The starting line of relevance in the file."
+    },
+    "end_line": {
+        "type": "number",
+        "description": "The ending line of relevance in the file."
+    },
+    "has_relevant_file": {
+        "type": "boolean",
+        "description": "Indicates whether a relevant file is known."
+    }
+}
+
+# Everything but the logs is the same on every request, so it's built once
+_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": [
+        {
+            "type": "text",
+            "text": _SYSTEM_PROMPT
+        }
+    ]
+}
+_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "file_relevance",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": _RELEVANCE_PROPERTIES,
+            "required": list(_RELEVANCE_PROPERTIES),
+            "additionalProperties": False
+        }
+    }
+}
+_BATCH_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": [
+        {
+            "type": "text",
+            "text": _SYSTEM_PROMPT + "\n- The input is a JSON array of separate errors, each with an id and its logs. Give one result per error, with the same id."
+        }
+    ]
+}
+# Structured outputs need an object at the root, so the array is wrapped
+_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "file_relevance_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {
+                                "type": "integer",
+                                "description": "The id of the error this result is for."
+                            },
+                            **_RELEVANCE_PROPERTIES
+                        },
+                        "required": ["id", *_RELEVANCE_PROPERTIES],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["results"],
+            "additionalProperties": False
+        }
+    }
+}
+_REQUEST_OPTIONS = {
+    "temperature": 1,
+    "max_completion_tokens": 2048,
+    "top_p": 1,
+    "stream": True
+}
+
+def _user_message(text):
+    """Wrap the text to send in a user message"""
+    return {"role": "user", "content": [{"type": "text", "text": text}]}
+
+def _read_stream(stream):
+    """
+    Collect a streamed completion, stopping once it holds a whole JSON object.
+    
+    The answer is a single JSON object, so there's nothing to wait for once
+    it closes; the stream is dropped rather than read to the end.
+    
+    Args:
+        stream: The stream returned by chat.completions.create(stream=True)
+        
+    Returns:
+        str: The completion text
+    """
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            # Only try to parse when the text could have just closed the object
+            if delta.rstrip().endswith('}'):
+                content = ''.join(parts)
+                try:
+                    json.loads(content)
+                except ValueError:
+                    continue
+                return content
+        return ''.join(parts)
+    finally:
+        stream.close()
+
+_NO_RELEVANT_FILE = {"file_path": "", "start_line": 0, "end_line": 0, "has_relevant_file": False}
+
+# Logs in a batch share one prompt, so each gets a smaller share of it
+BATCH_LOG_CHARS = 16000
+
+def find_relevant_code_batch(logs_list, oai_client=None, config_handler=None):
+    """
+    Locate the relevant code for several sets of logs with one request.
+    
+    Args:
+        logs_list (list): The logs for each error
+        oai_client: OpenAI client instance
+        config_handler: Configuration handler instance
+        
+    Returns:
+        list: One parsed result dict per entry of logs_list, in the same order
+    """
+    if not oai_client or not config_handler:
+        return [dict(_NO_RELEVANT_FILE) for _ in logs_list]
+    
+    items = [{"id": i, "logs": _compact_logs(logs, BATCH_LOG_CHARS)} for i, logs in enumerate(logs_list)]
+    response = oai_client.chat.completions.create(
+        model=config_handler.get_value("model_for_relevance_finder"),
+        messages=[_BATCH_SYSTEM_MESSAGE, _user_message(json.dumps(items))],
+        response_format=_BATCH_RESPONSE_FORMAT,
+        **_REQUEST_OPTIONS
+    )
+    
+    results = [dict(_NO_RELEVANT_FILE) for _ in logs_list]
+    for result in json.loads(_read_stream(response))["results"]:
+        index = result.pop("id")
+        if isinstance(index, int) and 0 <= index < len(results):
+            results[index] = result
+    return results
 
 def find_relevant_code(logs, oai_client=None, config_handler=None):
     if not oai_client or not config_handler:
@@ -7,66 +214,11 @@ def find_relevant_code(logs, oai_client=None, config_handler=None):
         
     response = oai_client.chat.completions.create(
         model=config_handler.get_value("model_for_relevance_finder"),
-        messages=[
-            {
-                "role": "system",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Given an error message and logs, identify the location of any relevant custom code.\n\nFocus on pinpointing relevant parts of custom code, excluding the interpreter's code, and specify the relevant file and its lines.\n\n# Steps\n\n1. **Analyze the Error Message**: Break down the error message to understand what went wrong.\n2. **Review the Logs**: Look through the logs to gather additional context that can help locate the problem.\n3. **Identify Custom Code**: Distinguish between custom code and interpreter code to focus on user-introduced sections.\n4. **Locate the File and Lines**: Determine the file path and specific line numbers where the issue is likely to originate.\n5. **Determine Relevance**: Assess whether a relevant file and lines can be identified post-analysis.\n\n# Notes\n\n- Ensure that the focus remains on custom code, excluding interpreter-level code."
-                    }
-                ]
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": logs
-                    }
-                ]
-            }
-        ],
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "file_relevance",
-                "strict": True,
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "The full Linux file path to where the relevant file is."
-                        },
-                        "start_line": {
-                            "type": "number",
-                            "description": "The starting line of relevance in the file."
-                        },
-                        "end_line": {
-                            "type": "number",
-                            "description": "The ending line of relevance in the file."
-                        },
-                        "has_relevant_file": {
-                            "type": "boolean",
-                            "description": "Indicates whether a relevant file is known."
-                        }
-                    },
-                    "required": [
-                        "file_path",
-                        "start_line",
-                        "end_line",
-                        "has_relevant_file"
-                    ],
-                    "additionalProperties": False
-                }
-            }
-        },
-        temperature=1,
-        max_completion_tokens=2048,
-        top_p=1
+        messages=[_SYSTEM_MESSAGE, _user_message(_compact_logs(logs))],
+        response_format=_RESPONSE_FORMAT,
+        **_REQUEST_OPTIONS
     )
 
-    return response.choices[0].message.content
+    return _read_stream(response)
 
 